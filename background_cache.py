@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from PIL import Image
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~/.cache"), "poster_generator", "backgrounds")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def cache_key(**inputs):
+    """Content address for a render: sha256 over every input that changes the pixels."""
+    payload = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class BackgroundCache:
+    """Persistent LRU of generated backgrounds, stored as PNG files named by key.
+
+    Recency is tracked through file mtimes so it survives restarts; writes go
+    to a temp file in the same directory and are moved into place atomically.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.getenv("POSTER_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_mb = os.getenv("POSTER_CACHE_MAX_MB")
+            max_bytes = int(max_mb) * 1024 * 1024 if max_mb else DEFAULT_MAX_BYTES
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._total_bytes = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _scan(self):
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".png"):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                self._entries[name[:-4]] = [st.st_size, st.st_mtime]
+                self._total_bytes += st.st_size
+            elif name.endswith(".tmp"):
+                # Left behind by a writer that died before os.replace
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+        try:
+            with Image.open(path) as img:
+                image = img.convert("RGB")
+            os.utime(path)
+            # Another worker may evict the file at any point; that is just a miss
+            mtime = os.path.getmtime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._drop(key)
+                self.misses += 1
+            return None
+        with self._lock:
+            entry[1] = mtime
+            self.hits += 1
+        return image
+
+    def put(self, key, image):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format="PNG")
+            size = os.path.getsize(tmp_path)
+            if size > self.max_bytes:
+                os.remove(tmp_path)
+                return
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._drop(key, remove_file=False)
+            self._entries[key] = [size, os.path.getmtime(self._path(key))]
+            self._total_bytes += size
+            self.writes += 1
+            self._evict()
+
+    def _drop(self, key, remove_file=True):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+        if remove_file:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        for key, _ in sorted(self._entries.items(), key=lambda kv: kv[1][1]):
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._drop(key)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
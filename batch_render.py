@@ -0,0 +1,210 @@
+"""Headless batch rendering of poster manifests.
+
+    python batch_render.py manifest.jsonl --out posters/
+
+Each manifest row (JSONL object or CSV row) may set: id, prompt, subtitle,
+details, logo (file path), aspect_ratio, model_id, seed. Diffusion runs on a
+small thread stage in this process so concurrent rows meet in the app's
+micro-batcher; logo processing, text layout and encoding run on a process
+pool whose workers import only poster_layout, never the app. Finished row ids
+are appended to <out>/checkpoint.txt, so re-running the same command resumes
+where an interrupted run stopped. Rows that had to fall back to a gradient
+background (model missing or diffusion failed) are still saved but go to
+failures.jsonl instead, so a resumed run renders them again. At most --max-inflight
+rows are held in memory at any time, whatever the manifest size.
+"""
+import argparse
+import csv
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image
+
+import encoding
+import poster_layout
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "version1-2.py")
+CHECKPOINT_NAME = "checkpoint.txt"
+FAILURES_NAME = "failures.jsonl"
+
+_app = None
+
+
+def load_app(path=APP_PATH):
+    """Import the Gradio app module (its file name is not a valid module name)."""
+    global _app
+    if _app is None:
+        spec = importlib.util.spec_from_file_location("poster_app", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _app = module
+    return _app
+
+
+def read_manifest(path):
+    """Yield manifest rows one at a time."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            for row in csv.DictReader(f):
+                yield {k: v for k, v in row.items() if v not in (None, "")}
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def row_id(index, row):
+    return str(row.get("id") or f"{index:06d}")
+
+
+def read_checkpoint(out_dir):
+    path = os.path.join(out_dir, CHECKPOINT_NAME)
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def render_background(row):
+    """Diffusion stage: the row's background, as the app's Background(image, from_model)."""
+    app = load_app()
+    width, height = app.ASPECT_RATIOS.get(row.get("aspect_ratio"), (1024, 1024))
+    return app.poster_gen.render_background(
+        row.get("prompt", ""),
+        width,
+        height,
+        seed=int(row.get("seed", app.DEFAULT_SEED)),
+        model_id=row.get("model_id")
+    )
+
+
+def compose_and_save(row, background, out_path, fmt="png"):
+    """Process-pool stage: logo, text layout and encoding for one row."""
+    logo = None
+    if row.get("logo"):
+        with Image.open(row["logo"]) as img:
+            logo = poster_layout.process_logo(img)
+    poster = poster_layout.apply_text_layout(
+        background, row.get("subtitle", ""), row.get("details", ""), logo
+    )
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(encoding.encode(poster, fmt).data)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+class BatchRun:
+    def __init__(self, out_dir, workers, diffusion_threads, max_inflight, fmt="png"):
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.workers = workers
+        self.diffusion_threads = diffusion_threads
+        self.max_inflight = max_inflight
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._lock = threading.Lock()
+        self._checkpoint = None
+        self._failures = None
+
+    def _finish(self, rid, error=None):
+        with self._lock:
+            if error is None:
+                self._checkpoint.write(rid + "\n")
+                self._checkpoint.flush()
+                self.done += 1
+            else:
+                self._failures.write(json.dumps({"id": rid, "error": str(error)}) + "\n")
+                self._failures.flush()
+                self.failed += 1
+                print(f"❌ {rid}: {error}")
+        self._slots.release()
+
+    def run(self, manifest):
+        os.makedirs(self.out_dir, exist_ok=True)
+        completed = read_checkpoint(self.out_dir)
+        app = load_app()
+        if not app.poster_gen.wait_until_ready():
+            print(f"⚠️ Model unavailable ({app.poster_gen.model_error}); "
+                  "rows get gradient backgrounds and are recorded as failed")
+
+        started = time.perf_counter()
+        context = multiprocessing.get_context("spawn")
+        with open(os.path.join(self.out_dir, CHECKPOINT_NAME), "a", encoding="utf-8") as self._checkpoint, \
+                open(os.path.join(self.out_dir, FAILURES_NAME), "a", encoding="utf-8") as self._failures, \
+                ThreadPoolExecutor(self.diffusion_threads, thread_name_prefix="diffusion") as diffusion, \
+                ProcessPoolExecutor(self.workers, mp_context=context) as composers:
+
+            def on_composed(rid, from_model, future):
+                error = future.exception()
+                if error is None and not from_model:
+                    # Saved, but keep it out of the checkpoint so a resumed run retries the model
+                    error = "gradient fallback background (model unavailable or diffusion failed)"
+                self._finish(rid, error)
+
+            def on_background(rid, row, out_path, future):
+                if future.exception() is not None:
+                    self._finish(rid, future.exception())
+                    return
+                background = future.result()
+                try:
+                    composed = composers.submit(compose_and_save, row, background.image, out_path, self.fmt)
+                except Exception as e:
+                    self._finish(rid, e)
+                    return
+                composed.add_done_callback(lambda f: on_composed(rid, background.from_model, f))
+
+            for index, row in enumerate(read_manifest(manifest)):
+                rid = row_id(index, row)
+                if rid in completed:
+                    self.skipped += 1
+                    continue
+                out_path = os.path.join(self.out_dir, f"{rid}.{encoding.FORMATS[self.fmt][2]}")
+                self._slots.acquire()
+                background = diffusion.submit(render_background, row)
+                background.add_done_callback(
+                    lambda f, rid=rid, row=row, out_path=out_path: on_background(rid, row, out_path, f)
+                )
+                if (index + 1) % 50 == 0:
+                    print(f"📦 {self.done} done, {self.failed} failed, {self.skipped} skipped")
+
+            # Every slot back means every row has finished
+            for _ in range(self.max_inflight):
+                self._slots.acquire()
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ {self.done} rendered, {self.failed} failed, {self.skipped} already done in {elapsed:.1f}s")
+        return self.failed == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render posters from a JSONL or CSV manifest")
+    parser.add_argument("manifest")
+    parser.add_argument("--out", default="posters")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--diffusion-threads", type=int, default=None,
+                        help="concurrent background requests (default: the app's max batch size)")
+    parser.add_argument("--max-inflight", type=int, default=None,
+                        help="rows held in memory at once (default: 2 x workers + diffusion threads)")
+    parser.add_argument("--format", choices=list(encoding.FORMATS), default="png",
+                        help="output format; quality via POSTER_OUTPUT_QUALITY / POSTER_PNG_COMPRESS_LEVEL")
+    args = parser.parse_args(argv)
+
+    app = load_app()
+    diffusion_threads = args.diffusion_threads or app.MAX_BATCH_SIZE
+    max_inflight = args.max_inflight or 2 * args.workers + diffusion_threads
+    run = BatchRun(args.out, args.workers, diffusion_threads, max_inflight, args.format)
+    return 0 if run.run(args.manifest) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import tracing
+
+
+class MicroBatcher:
+    """Collects requests that share a key for a short window and runs them together.
+
+    `run_batch(key, items)` must return one result per item, in order. Requests
+    are grouped by key (e.g. output resolution) because a pipeline batch has to
+    share its latent shape. A batch is dispatched when it reaches
+    `max_batch_size` or when its oldest request has waited `max_wait` seconds.
+    The batch runs in the context of its first request, with the stages it
+    records added to the trace of every request in it.
+    """
+
+    def __init__(self, run_batch, max_batch_size=4, max_wait=0.05):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self.batches_run = 0
+        self.items_run = 0
+        self._pending = OrderedDict()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, key, item):
+        future = Future()
+        with self._cond:
+            self._pending.setdefault(key, []).append((item, future, time.monotonic(), contextvars.copy_context()))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def __call__(self, key, item):
+        return self.submit(key, item).result()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+
+            # Serve the key whose oldest request has been waiting longest
+            key = min(self._pending, key=lambda k: self._pending[k][0][2])
+            queue = self._pending[key]
+            deadline = queue[0][2] + self.max_wait
+            while len(queue) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = queue[:self.max_batch_size]
+            del queue[:self.max_batch_size]
+            if not queue:
+                del self._pending[key]
+            return key, batch
+
+    def _loop(self):
+        while True:
+            key, batch = self._next_batch()
+            live = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not live:
+                continue
+            traces = [trace for *_, context in live for trace in context.run(tracing.current_traces)]
+            try:
+                results = live[0][3].run(self._run_traced, key, [item for item, *_ in live], traces)
+                if len(results) != len(live):
+                    raise RuntimeError(f"Batch returned {len(results)} results for {len(live)} requests")
+            except Exception as e:
+                for _, future, *_ in live:
+                    future.set_exception(e)
+                continue
+            self.batches_run += 1
+            self.items_run += len(live)
+            for (_, future, *_), result in zip(live, results):
+                future.set_result(result)
+
+    def _run_traced(self, key, items, traces):
+        with tracing.shared_traces(traces):
+            return self.run_batch(key, items)
+
+    def stats(self):
+        with self._cond:
+            queued = sum(len(q) for q in self._pending.values())
+        return {
+            "batches_run": self.batches_run,
+            "items_run": self.items_run,
+            "mean_batch_size": self.items_run / self.batches_run if self.batches_run else 0.0,
+            "queued": queued,
+        }
@@ -0,0 +1,251 @@
+"""Micro-benchmarks for poster composition and image transforms.
+
+    python benchmarks/bench_poster.py                      # run and save results
+    python benchmarks/bench_poster.py --compare benchmarks/results/<old>.json
+    python benchmarks/bench_poster.py --quick --no-e2e     # skip print size and diffusion
+
+Every case runs at the five UI aspect ratios and at A2 print resolution and
+records the median wall time plus peak memory: Python/NumPy allocations via
+tracemalloc and resident set growth sampled from /proc (Linux only).
+End-to-end generate_simple_poster runs against a tiny random pipeline, so no
+model download or network is needed.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+PRINT_SIZE = ("A2 print 300dpi", (4961, 7016))
+REGRESSION_THRESHOLD = 0.15
+
+
+def load_script(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class PeakRSS:
+    """Samples RSS on a thread while the block runs; `growth` is peak minus start."""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.growth = None
+
+    def __enter__(self):
+        self._start = _rss_bytes()
+        self._peak = self._start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.is_set():
+            rss = _rss_bytes()
+            if rss is not None and rss > self._peak:
+                self._peak = rss
+            time.sleep(self.interval)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        if self._start is not None:
+            self.growth = self._peak - self._start
+
+
+def measure(fn, repeat):
+    fn()  # warm caches and lazy imports, as a long-running server would be
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    with PeakRSS() as rss:
+        fn()
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "min_ms": round(min(times) * 1000, 3),
+        "traced_peak_bytes": traced_peak,
+        "rss_growth_bytes": rss.growth,
+    }
+
+
+def composition_cases(app, streamlit_app, label, width, height):
+    from PIL import Image
+
+    gen = app.poster_gen
+    subtitle = "Tech Summit 2024"
+    details = "December 15-17, 2024\nConvention Center\nRegister: techsummit.com"
+    logo_source = Image.new("RGBA", (600, 400), (200, 40, 40, 255))
+    background = gen.create_gradient_background(width, height, (100, 150, 255), (150, 200, 255))
+    logo = gen.process_logo(logo_source)
+    font = gen.get_font(max(8, int(min(width, height) // 15 * 0.8)))
+
+    def encode_outputs():
+        import encoding
+        encoding.clear_cache()  # time the encode itself, not a cache hit
+        encoding.derivatives(background)
+
+    def gradient_cold():
+        import gradients
+        gradients.clear_cache()  # time the render, not an LRU hit
+        gen.create_gradient_background(width, height, (100, 150, 255), (150, 200, 255))
+
+    # Built once: the tint pass over the full canvas is not part of text drawing
+    compositor = app.PosterCompositor(background)
+
+    def draw_outline():
+        gen.draw_text_with_outline(compositor, subtitle, width // 2, height // 3, font, "white", "black", center=True)
+
+    cases = [
+        ("create_gradient_background", gradient_cold),
+        ("create_gradient_background_cached", lambda: gen.create_gradient_background(
+            width, height, (100, 150, 255), (150, 200, 255))),
+        ("apply_text_layout", lambda: gen.apply_text_layout(background, subtitle, details, logo)),
+        ("draw_text_with_outline", draw_outline),
+        ("process_logo", lambda: gen.process_logo(logo_source)),
+        ("encode_derivatives", encode_outputs),
+    ]
+    if (label, (width, height)) == PRINT_SIZE:
+        # Same poster, but tiled and streamed to disk: peak memory should stay flat
+        small = gen.create_gradient_background(*app.print_base_size((width, height)), (100, 150, 255), (150, 200, 255))
+        out_path = os.path.join(tempfile.mkdtemp(prefix="poster-bench-print-"), "print.png")
+        cases.append(("create_print_poster", lambda: gen.create_print_poster(
+            small, "", subtitle, details, logo_source, (width, height), out_path, refine_strength=0)))
+    if streamlit_app is not None:
+        photo = background.copy()
+        cases.append(("apply_mock_transformation", lambda: streamlit_app.apply_mock_transformation(
+            photo, "make it bright and vintage with more contrast")))
+    return [(case, label, fn) for case, fn in cases]
+
+
+def end_to_end_cases(app, sizes):
+    from tiny_pipeline import TINY_MODEL_ID, build_tiny_pipeline
+
+    gen = app.poster_gen
+    pipe = build_tiny_pipeline()
+    gen.model_id = TINY_MODEL_ID
+    gen.pipe = pipe
+    gen.model_state = app.MODEL_READY
+    seeds = iter(range(1, 10 ** 9))
+
+    for label, _ in sizes:
+        # A fresh seed per call so every run is a background-cache miss
+        yield "generate_simple_poster", label, lambda label=label: app.generate_simple_poster(
+            "Tech conference poster", "Tech Summit 2024", "December 15-17, 2024",
+            None, label, seed=next(seeds))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["case"], r["size"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = baseline.get((r["case"], r["size"]))
+        if old and old["median_ms"] > 0:
+            change = r["median_ms"] / old["median_ms"] - 1
+            marker = "  ⚠️ REGRESSION" if change > REGRESSION_THRESHOLD else ""
+            print(f"{r['case']:<28} {r['size']:<20} {old['median_ms']:>10.2f} → {r['median_ms']:>10.2f} ms ({change:+.0%}){marker}")
+            if marker:
+                regressions.append(r)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--quick", action="store_true", help="skip print resolution")
+    parser.add_argument("--no-e2e", action="store_true", help="skip end-to-end runs on the tiny pipeline")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    # Keep benchmark renders out of the user's background cache
+    os.environ.setdefault("POSTER_CACHE_DIR", tempfile.mkdtemp(prefix="poster-bench-cache-"))
+    app = load_script("poster_app", "version1-2.py")
+    try:
+        streamlit_app = load_script("streamlit_app", "streamlitapp.py")
+    except Exception as e:
+        print(f"⚠️ Skipping apply_mock_transformation: {e}")
+        streamlit_app = None
+
+    sizes = list(app.ASPECT_RATIOS.items())
+    if not args.quick:
+        sizes.append(PRINT_SIZE)
+
+    cases = []
+    for label, (width, height) in sizes:
+        cases += composition_cases(app, streamlit_app, label, width, height)
+    if not args.no_e2e:
+        cases += list(end_to_end_cases(app, list(app.ASPECT_RATIOS.items())))
+
+    results = []
+    for case, size, fn in cases:
+        repeat = 1 if case == "generate_simple_poster" else args.repeat
+        try:
+            stats = measure(fn, repeat)
+        except Exception as e:
+            print(f"{case:<28} {size:<20} failed: {e}")
+            continue
+        rss = stats["rss_growth_bytes"]
+        rss_text = f"{rss / 2**20:8.1f} MiB RSS" if rss is not None else ""
+        print(f"{case:<28} {size:<20} {stats['median_ms']:>10.2f} ms  "
+              f"{stats['traced_peak_bytes'] / 2**20:8.1f} MiB traced {rss_text}")
+        results.append({"case": case, "size": size, **stats})
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{report['timestamp'].replace(':', '')}-{report['revision']}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Saved {path}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
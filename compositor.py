@@ -0,0 +1,46 @@
+class PosterCompositor:
+    """Single-buffer poster compositing.
+
+    The darkening tint is applied while making the one working copy of the
+    background (a point LUT, which for an opaque base is exactly what
+    alpha-compositing a flat black layer does). Text sprites and the logo are
+    then blended straight into that RGB buffer, each limited to its own
+    bounding box, so no full-canvas overlay or RGBA conversion is needed.
+    `allocated_bytes` counts every buffer the compositor itself allocated.
+    """
+
+    def __init__(self, background, tint_alpha=80, tint_color=(0, 0, 0)):
+        if background.mode != "RGB":
+            background = background.convert("RGB")
+            self.allocated_bytes = self.estimate_bytes(*background.size)
+        else:
+            self.allocated_bytes = 0
+
+        keep = 255 - tint_alpha
+        lut = []
+        for color in tint_color:
+            lut.extend((v * keep + color * tint_alpha + 127) // 255 for v in range(256))
+        self.canvas = background.point(lut)
+        self.allocated_bytes += self.estimate_bytes(*self.canvas.size)
+
+    @property
+    def size(self):
+        return self.canvas.size
+
+    @staticmethod
+    def estimate_bytes(width, height):
+        return width * height * 3
+
+    def paste(self, layer, position):
+        """Blend an RGBA (or opaque) layer into the canvas at `position`, in place."""
+        if layer.mode == "RGBA":
+            self.canvas.paste(layer, position, layer)
+        elif layer.mode in ("RGB", "L"):
+            self.canvas.paste(layer, position)
+        else:
+            layer = layer.convert("RGBA")
+            self.allocated_bytes += layer.width * layer.height * 4
+            self.canvas.paste(layer, position, layer)
+
+    def result(self):
+        return self.canvas
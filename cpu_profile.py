@@ -0,0 +1,165 @@
+import contextlib
+import json
+import os
+import platform
+import tempfile
+import time
+import weakref
+
+import torch
+
+PROFILE = os.getenv("POSTER_INFERENCE_PROFILE", "default")
+CPU_OPTIMIZED = "cpu-optimized"
+COMPILE_UNET = os.getenv("POSTER_COMPILE_UNET", "0") == "1"
+PROFILE_CACHE = os.path.join(os.path.expanduser("~/.cache"), "poster_generator", "cpu_profile.json")
+
+BENCH_PROMPT = "a poster background, abstract shapes"
+BENCH_SIZE = 256
+BENCH_STEPS = 2
+
+# Settings applied to each pipeline, consulted by inference_context()
+_applied = weakref.WeakKeyDictionary()
+# Components each pipeline shares with other loaded models, never modified in place
+_shared = weakref.WeakKeyDictionary()
+
+
+def bf16_supported():
+    get_capability = getattr(getattr(torch.backends, "cpu", None), "get_cpu_capability", None)
+    if get_capability is None:
+        return False
+    capability = get_capability()
+    return "AVX512" in capability or "AMX" in capability
+
+
+def host_fingerprint():
+    return "|".join([platform.node(), platform.machine(), str(os.cpu_count()), torch.__version__])
+
+
+def default_config():
+    return {
+        "threads": os.cpu_count() or 1,
+        "channels_last": False,
+        "bf16_autocast": False,
+        "attention_slicing": False,
+        "compile_unet": False,
+    }
+
+
+def apply_config(pipe, config):
+    torch.set_num_threads(config["threads"])
+    shared = _shared.get(pipe, ())
+    memory_format = torch.channels_last if config["channels_last"] else torch.contiguous_format
+    for name in ("unet", "vae"):
+        if name not in shared:
+            getattr(pipe, name).to(memory_format=memory_format)
+    # Slicing swaps the UNet's attention processors, so it is in place too
+    if "unet" not in shared:
+        if config["attention_slicing"]:
+            pipe.enable_attention_slicing()
+        else:
+            pipe.disable_attention_slicing()
+    compiled = hasattr(pipe.unet, "_orig_mod")
+    if config["compile_unet"] and hasattr(torch, "compile") and not compiled:
+        pipe.unet = torch.compile(pipe.unet, mode="reduce-overhead", fullgraph=False)
+    elif not config["compile_unet"] and compiled:
+        pipe.unet = pipe.unet._orig_mod
+    _applied[pipe] = dict(config)
+    return pipe
+
+
+def inference_context(pipe):
+    """Autocast context matching the profile applied to `pipe` (no-op otherwise)."""
+    config = _applied.get(pipe)
+    if config and config["bf16_autocast"]:
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def _time_config(pipe, config):
+    apply_config(pipe, config)
+    generator = torch.Generator(device="cpu").manual_seed(0)
+    run = lambda: pipe(
+        BENCH_PROMPT, width=BENCH_SIZE, height=BENCH_SIZE,
+        num_inference_steps=BENCH_STEPS, generator=generator
+    )
+    with torch.inference_mode(), inference_context(pipe):
+        run()  # warm-up: allocator, oneDNN primitives, compile
+        started = time.perf_counter()
+        run()
+    return time.perf_counter() - started
+
+
+def _candidates():
+    cores = os.cpu_count() or 1
+    yield "threads", sorted({cores, max(1, cores // 2)}, reverse=True)
+    yield "channels_last", [False, True]
+    if bf16_supported():
+        yield "bf16_autocast", [False, True]
+    yield "attention_slicing", [False, True]
+    if COMPILE_UNET:
+        yield "compile_unet", [False, True]
+
+
+def self_benchmark(pipe):
+    """Greedy search over the profile knobs: keep each setting that makes a short render faster."""
+    best = default_config()
+    best_time = _time_config(pipe, best)
+    for knob, values in _candidates():
+        for value in values:
+            if value == best[knob]:
+                continue
+            trial = {**best, knob: value}
+            try:
+                elapsed = _time_config(pipe, trial)
+            except Exception as e:
+                print(f"⚠️ CPU profile: {knob}={value} failed ({e})")
+                continue
+            if elapsed < best_time:
+                best, best_time = trial, elapsed
+    print(f"⚙️ CPU profile: {best} ({best_time / BENCH_STEPS:.2f}s/step at {BENCH_SIZE}px)")
+    return best
+
+
+def _read_cache():
+    try:
+        with open(PROFILE_CACHE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache(data):
+    os.makedirs(os.path.dirname(PROFILE_CACHE), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(PROFILE_CACHE), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, PROFILE_CACHE)
+
+
+def optimize(pipe, profile=None, rebenchmark=False, shared=()):
+    """Apply the inference profile to a CPU pipeline.
+
+    For "cpu-optimized" the fastest configuration is measured once per host
+    and model and remembered in PROFILE_CACHE; "default" leaves the pipeline
+    untouched. Components named in `shared` are also used by other loaded
+    models, so their layout and attention processors are left as they are.
+    """
+    profile = profile or PROFILE
+    if profile != CPU_OPTIMIZED or pipe.device.type != "cpu":
+        return pipe
+
+    _shared[pipe] = frozenset(shared)
+    if shared:
+        print(f"⚙️ CPU profile: leaving shared {', '.join(sorted(shared))} unchanged")
+
+    key = f"{host_fingerprint()}|{pipe.config.get('_name_or_path', '')}"
+    cache = _read_cache()
+    config = None if rebenchmark else cache.get(key)
+    if config is None:
+        config = self_benchmark(pipe)
+        cache[key] = config
+        try:
+            _write_cache(cache)
+        except OSError as e:
+            print(f"⚠️ Could not save CPU profile: {e}")
+    return apply_config(pipe, {**default_config(), **config})
@@ -0,0 +1,209 @@
+import contextvars
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import tracing
+
+# name -> (Pillow format, MIME type, file extension)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "png": ("PNG", "image/png", "png"),
+}
+
+DEFAULT_FORMAT = os.getenv("POSTER_OUTPUT_FORMAT", "webp").lower()
+# Lossy quality for WebP/JPEG, 1-100
+QUALITY = int(os.getenv("POSTER_OUTPUT_QUALITY", "85"))
+# zlib level for PNG; Pillow's default of 6 is several times slower than 1
+# for a file that is only slightly smaller
+PNG_COMPRESS_LEVEL = int(os.getenv("POSTER_PNG_COMPRESS_LEVEL", "1"))
+# WebP encoder effort, 0 (fast) to 6 (small)
+WEBP_METHOD = int(os.getenv("POSTER_WEBP_METHOD", "4"))
+
+# name -> (longest side or None for full size, format, quality)
+DERIVATIVES = {
+    "thumbnail": (256, "webp", 75),
+    "web": (1024, DEFAULT_FORMAT, QUALITY),
+    "print": (None, os.getenv("POSTER_PRINT_FORMAT", "png").lower(), 95),
+}
+
+CACHE_MAX_BYTES = int(os.getenv("POSTER_ENCODE_CACHE_MB", "128")) * 1024 * 1024
+ENCODE_THREADS = int(os.getenv("POSTER_ENCODE_THREADS", str(min(4, os.cpu_count() or 1))))
+
+# data: encoded bytes; mime/extension: for download buttons and file names;
+# size: pixel size of the encoded image
+Encoded = namedtuple("Encoded", ["data", "mime", "extension", "size"])
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(ENCODE_THREADS, thread_name_prefix="encode")
+        return _pool
+
+
+def image_key(image):
+    """Content hash of an image, for results that have no natural key."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.size}".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _prepare(image, fmt):
+    if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+        if image.mode in ("RGBA", "LA"):
+            # JPEG has no alpha: flatten onto white rather than black
+            flat = Image.new("RGB", image.size, "white")
+            flat.paste(image.convert("RGBA"), mask=image.getchannel("A"))
+            return flat
+        return image.convert("RGB")
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        return image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    return image
+
+
+def _encode(image, fmt, quality):
+    pil_format, mime, extension = FORMATS[fmt]
+    options = {}
+    if fmt == "png":
+        options = {"compress_level": PNG_COMPRESS_LEVEL}
+    elif fmt == "webp":
+        options = {"quality": quality, "method": WEBP_METHOD}
+    elif fmt == "jpeg":
+        options = {"quality": quality, "optimize": False, "progressive": True}
+    buf = io.BytesIO()
+    with tracing.stage("encode", format=fmt):
+        _prepare(image, fmt).save(buf, format=pil_format, **options)
+    return Encoded(buf.getvalue(), mime, extension, image.size)
+
+
+def _resize(image, max_side):
+    if max_side is None or max(image.size) <= max_side:
+        return image
+    scaled = image.copy()
+    scaled.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return scaled
+
+
+def _cached(key, build):
+    global _cache_bytes
+    if key is not None:
+        with _cache_lock:
+            encoded = _cache.get(key)
+            if encoded is not None:
+                _cache.move_to_end(key)
+                _stats["hits"] += 1
+                return encoded
+            _stats["misses"] += 1
+
+    encoded = build()
+    size = len(encoded.data)
+    if key is not None and size <= CACHE_MAX_BYTES:
+        with _cache_lock:
+            if key not in _cache:
+                _cache[key] = encoded
+                _cache_bytes += size
+            while _cache_bytes > CACHE_MAX_BYTES and _cache:
+                _, evicted = _cache.popitem(last=False)
+                _cache_bytes -= len(evicted.data)
+    return encoded
+
+
+def encode(image, fmt=None, quality=None, max_side=None, key=None):
+    """Encode one image; pass `key` (anything hashable naming the result) to cache the bytes."""
+    fmt = (fmt or DEFAULT_FORMAT).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown output format: {fmt}")
+    quality = QUALITY if quality is None else quality
+    cache_key = None if key is None else (key, fmt, quality, max_side)
+    return _cached(cache_key, lambda: _encode(_resize(image, max_side), fmt, quality))
+
+
+def derivatives(image, names=None, key=None):
+    """Encode the thumbnail/web/print derivatives in parallel, {name: Encoded}.
+
+    Pillow releases the GIL while resampling and encoding, so the derivatives
+    really do run side by side. Without a `key` the image content is hashed,
+    so the same poster is never encoded twice while it stays in the cache.
+    """
+    names = list(names or DERIVATIVES)
+    if key is None:
+        key = image_key(image)
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGB")
+    image.load()
+    pool = _executor()
+    futures = {}
+    for name in names:
+        max_side, fmt, quality = DERIVATIVES[name]
+        # Carry the request's trace into the pool thread
+        futures[name] = pool.submit(contextvars.copy_context().run, encode, image, fmt, quality, max_side, key)
+    return {name: future.result() for name, future in futures.items()}
+
+
+def write_files(encoded, directory, stem):
+    """Write {name: Encoded} as <stem>-<name>.<ext>, atomically; returns {name: path}."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, item in encoded.items():
+        path = os.path.join(directory, f"{stem}-{name}.{item.extension}")
+        if os.path.exists(path):
+            # Reused: bump the mtime so prune_directory treats it as fresh
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        else:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(item.data)
+            os.replace(tmp_path, path)
+        paths[name] = path
+    return paths
+
+
+def prune_directory(directory, keep, since=None):
+    """Delete all but the `keep` most recently written files in `directory`.
+
+    In-progress `.tmp` files are never touched, nor is anything modified at
+    or after `since` (a time.time() value, e.g. when the current render began).
+    """
+    try:
+        entries = [os.path.join(directory, name) for name in os.listdir(directory) if not name.endswith(".tmp")]
+        files = sorted(((os.path.getmtime(p), p) for p in entries if os.path.isfile(p)), reverse=True)
+    except OSError:
+        return
+    for mtime, path in files[keep:]:
+        if since is not None and mtime >= since:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def cache_info():
+    with _cache_lock:
+        return {"entries": len(_cache), "bytes": _cache_bytes, **_stats}
+
+
+def clear_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
@@ -0,0 +1,156 @@
+import re
+
+from PIL import Image, ImageFilter
+
+# (effect, trigger words). Matching is by substring, as the original keyword
+# checks were, so "lighter" still counts as "light".
+EFFECT_KEYWORDS = [
+    ("blur", ("blur", "soft", "dream")),
+    ("sharpen", ("sharp", "enhance", "crisp")),
+    ("bright", ("bright", "light", "sunny")),
+    ("dark", ("dark", "moody", "shadow")),
+    ("colorful", ("colorful", "vibrant", "saturated")),
+    ("vintage", ("vintage", "old", "sepia")),
+    ("mono", ("black", "white", "mono")),
+    ("contrast", ("contrast", "dramatic")),
+]
+
+# Order effects are applied in, whatever order the prompt mentions them:
+# colour matrix, then tone curves, then the spatial filters
+EFFECT_ORDER = ["colorful", "default", "mono", "vintage", "bright", "dark", "contrast", "blur", "sharpen"]
+
+SATURATION = {"colorful": 1.5, "default": 1.2}
+BRIGHTNESS = {"bright": 1.3, "dark": 0.7}
+CONTRAST = 1.5
+SEPIA_BLACK = (0x70, 0x42, 0x14)
+SEPIA_WHITE = (0xC0, 0xA8, 0x82)
+SPATIAL = {
+    "blur": ImageFilter.GaussianBlur(radius=2),
+    "sharpen": ImageFilter.SHARPEN,
+}
+
+_WORD_TO_EFFECT = {word: effect for effect, words in EFFECT_KEYWORDS for word in words}
+# Longest first so "colorful" is not shadowed by a shorter overlapping word
+_MATCHER = re.compile("|".join(re.escape(w) for w in sorted(_WORD_TO_EFFECT, key=len, reverse=True)))
+
+
+def parse_effects(prompt):
+    """Every effect the prompt asks for, in application order (one regex scan)."""
+    found = {_WORD_TO_EFFECT[m.group(0)] for m in _MATCHER.finditer(prompt.lower())}
+    if not found:
+        found = {"default"}
+    return [effect for effect in EFFECT_ORDER if effect in found]
+
+
+def _clip(value):
+    return 0 if value < 0 else 255 if value > 255 else int(value + 0.5)
+
+
+def _saturation_matrix(factor):
+    # Blend each channel with ITU-R 601 luma, which is what ImageEnhance.Color does
+    luma = (0.299, 0.587, 0.114)
+    rows = []
+    for channel in range(3):
+        row = [(1 - factor) * w for w in luma]
+        row[channel] += factor
+        rows.extend(row + [0])
+    return tuple(rows)
+
+
+def _mean_luma(histogram, luts):
+    # Mean grey level of the image as it would look after `luts`, from one histogram
+    means = []
+    for channel, lut in enumerate(luts):
+        counts = histogram[channel * 256:(channel + 1) * 256]
+        total = sum(counts) or 1
+        means.append(sum(c * lut[v] for v, c in enumerate(counts)) / total)
+    if len(means) == 1:
+        return int(means[0] + 0.5)
+    return int(0.299 * means[0] + 0.587 * means[1] + 0.114 * means[2] + 0.5)
+
+
+def apply_effects(image, effects, progress=None):
+    """Apply a parsed effect chain with the point operations fused into one LUT.
+
+    Saturation is a single colour-matrix conversion, brightness, contrast,
+    greyscale and sepia compose into one lookup table, and only blur and
+    sharpen need a pass of their own. `progress(fraction, message)` is called
+    after each pass over the pixels.
+    """
+    alpha = image.getchannel("A") if image.mode in ("RGBA", "LA") else None
+    if image.mode in ("RGB", "L"):
+        img = image
+    elif image.mode == "LA":
+        img = image.convert("L")
+    else:
+        img = image.convert("RGB")
+
+    grey = "mono" in effects or "vintage" in effects
+    saturation = 1.0
+    for effect in effects:
+        saturation *= SATURATION.get(effect, 1.0)
+    tonal = [e for e in effects if e in BRIGHTNESS or e == "contrast"]
+    spatial = [e for e in effects if e in SPATIAL]
+
+    # Saturation cannot change a grey image
+    passes = [
+        grey and img.mode != "L",
+        saturation != 1.0 and img.mode == "RGB" and not grey,
+        "contrast" in effects,
+        bool(tonal) or "vintage" in effects,
+    ].count(True) + len(spatial)
+    completed = [0]
+
+    def step(message):
+        completed[0] += 1
+        if progress is not None:
+            progress(completed[0] / max(1, passes), message)
+
+    if grey and img.mode != "L":
+        img = img.convert("L")
+        step("Converting to greyscale")
+
+    if saturation != 1.0 and img.mode == "RGB":
+        img = img.convert("RGB", _saturation_matrix(saturation))
+        step("Adjusting colour")
+
+    luts = [list(range(256)) for _ in range(len(img.getbands()))]
+    histogram = None
+    for effect in tonal:
+        if effect in BRIGHTNESS:
+            factor = BRIGHTNESS[effect]
+            luts = [[_clip(v * factor) for v in lut] for lut in luts]
+        else:
+            if histogram is None:
+                histogram = img.histogram()
+                step("Measuring contrast")
+            mean = _mean_luma(histogram, luts)
+            luts = [[_clip(mean + (v - mean) * CONTRAST) for v in lut] for lut in luts]
+
+    if "vintage" in effects:
+        # Colourise the grey levels: one LUT per output channel, read from L
+        sepia = [
+            [_clip(black + (white - black) * v / 255) for v in luts[0]]
+            for black, white in zip(SEPIA_BLACK, SEPIA_WHITE)
+        ]
+        img = Image.merge("RGB", [img.point(lut) for lut in sepia])
+        step("Applying sepia tone")
+    elif tonal:
+        img = img.point([v for lut in luts for v in lut])
+        step("Applying tone curve")
+
+    for effect in spatial:
+        img = img.filter(SPATIAL[effect])
+        step("Blurring" if effect == "blur" else "Sharpening")
+
+    if img is image:
+        img = image.copy()
+    elif alpha is not None and img.mode in ("RGB", "L"):
+        img.putalpha(alpha)
+    if progress is not None:
+        progress(1.0, "Done")
+    return img
+
+
+def transform(image, prompt, progress=None):
+    return apply_effects(image, parse_effects(prompt), progress)
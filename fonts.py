@@ -0,0 +1,98 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from PIL import ImageFont
+
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc")
+DEFAULT_FAMILIES = ("arial", "dejavusans")
+
+
+def system_font_dirs():
+    home = os.path.expanduser("~")
+    if sys.platform.startswith("win"):
+        windir = os.environ.get("WINDIR", r"C:\Windows")
+        return [
+            os.path.join(windir, "Fonts"),
+            os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft", "Windows", "Fonts"),
+        ]
+    if sys.platform == "darwin":
+        return ["/System/Library/Fonts", "/Library/Fonts", os.path.join(home, "Library/Fonts")]
+    return [
+        "/usr/share/fonts",
+        "/usr/local/share/fonts",
+        os.path.join(home, ".fonts"),
+        os.path.join(home, ".local/share/fonts"),
+    ]
+
+
+def _family_key(name):
+    return "".join(ch for ch in name.lower() if ch.isalnum())
+
+
+class FontRegistry:
+    """Index of installed fonts, built once, plus an LRU of loaded FreeType fonts.
+
+    Families are resolved by normalised file name, so "Arial", "arial.ttf" and
+    "DejaVu Sans" all find the obvious file without probing the file system.
+    """
+
+    def __init__(self, font_dirs=None, max_loaded=64):
+        self.font_dirs = font_dirs or system_font_dirs()
+        self.max_loaded = max_loaded
+        self._index = None
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def scan(self):
+        index = {}
+        for root_dir in self.font_dirs:
+            if not root_dir or not os.path.isdir(root_dir):
+                continue
+            for dirpath, _, filenames in os.walk(root_dir):
+                for filename in filenames:
+                    stem, ext = os.path.splitext(filename)
+                    if ext.lower() in FONT_EXTENSIONS:
+                        # First directory wins, matching the platform's own lookup order
+                        index.setdefault(_family_key(stem), os.path.join(dirpath, filename))
+        with self._lock:
+            self._index = index
+        return len(index)
+
+    def resolve(self, family):
+        if self._index is None:
+            self.scan()
+        key = _family_key(os.path.splitext(family)[0])
+        for candidate in (key, key + "regular", key + "book"):
+            path = self._index.get(candidate)
+            if path:
+                return path
+        return None
+
+    def get(self, size, families=DEFAULT_FAMILIES):
+        """Return a FreeTypeFont for the first family that resolves, or Pillow's default font."""
+        for family in families:
+            path = self.resolve(family)
+            if path is None:
+                continue
+            key = (path, size)
+            with self._lock:
+                font = self._loaded.get(key)
+                if font is not None:
+                    self._loaded.move_to_end(key)
+                    return font
+            try:
+                font = ImageFont.truetype(path, size)
+            except OSError as e:
+                print(f"Font loading error ({path}): {e}")
+                continue
+            with self._lock:
+                self._loaded[key] = font
+                while len(self._loaded) > self.max_loaded:
+                    self._loaded.popitem(last=False)
+            return font
+        return ImageFont.load_default()
+
+
+registry = FontRegistry()
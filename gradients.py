@@ -0,0 +1,143 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+# Rendered gradients are kept in memory so repeated fallback renders at the
+# same size and colours are a copy instead of a re-render. The cache is
+# bounded by bytes rather than entries because print-size gradients are big.
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+LUT_SIZE = 1024
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def normalize_stops(colors):
+    """Turn [c1, c2, ...] or [(pos, c), ...] into a hashable tuple of stops."""
+    colors = list(colors)
+    if len(colors) < 2:
+        raise ValueError("A gradient needs at least two colors")
+
+    if all(len(c) == 2 and not isinstance(c[0], (tuple, list)) for c in colors):
+        stops = [(float(pos), tuple(int(v) for v in rgb[:3])) for pos, rgb in colors]
+    else:
+        last = len(colors) - 1
+        stops = [(i / last, tuple(int(v) for v in c[:3])) for i, c in enumerate(colors)]
+
+    stops.sort(key=lambda s: s[0])
+    return tuple(stops)
+
+
+def _interpolate(t, stops):
+    positions = np.array([s[0] for s in stops], dtype=np.float64)
+    rgb = np.array([s[1] for s in stops], dtype=np.float64)
+    out = np.empty(t.shape + (3,), dtype=np.uint8)
+    for channel in range(3):
+        # astype truncates, which matches the int() of the old per-row loop
+        out[..., channel] = np.interp(t, positions, rgb[:, channel]).astype(np.uint8)
+    return out
+
+
+def _lookup(t, stops):
+    # Full 2D fields go through a small LUT instead of three full-size interps
+    lut = _interpolate(np.linspace(0.0, 1.0, LUT_SIZE), stops)
+    index = np.clip(t * (LUT_SIZE - 1), 0, LUT_SIZE - 1).astype(np.intp)
+    return lut[index]
+
+
+def _render_linear(width, height, stops, angle):
+    angle = angle % 360
+    if angle in (90, 270):
+        t = np.arange(height, dtype=np.float64) / height
+        if angle == 270:
+            t = 1.0 - t
+        column = _interpolate(t, stops)[:, None, :]
+        return np.ascontiguousarray(np.broadcast_to(column, (height, width, 3)))
+    if angle in (0, 180):
+        t = np.arange(width, dtype=np.float64) / width
+        if angle == 180:
+            t = 1.0 - t
+        row = _interpolate(t, stops)[None, :, :]
+        return np.ascontiguousarray(np.broadcast_to(row, (height, width, 3)))
+
+    rad = math.radians(angle)
+    dx, dy = math.cos(rad), math.sin(rad)
+    xs = np.arange(width, dtype=np.float32) * dx
+    ys = np.arange(height, dtype=np.float32) * dy
+    t = ys[:, None] + xs[None, :]
+    lo, hi = float(t.min()), float(t.max())
+    t = (t - lo) / ((hi - lo) or 1.0)
+    return _lookup(t, stops)
+
+
+def _render_radial(width, height, stops, center):
+    cx, cy = center[0] * width, center[1] * height
+    xs = (np.arange(width, dtype=np.float32) - cx) ** 2
+    ys = (np.arange(height, dtype=np.float32) - cy) ** 2
+    t = np.sqrt(ys[:, None] + xs[None, :])
+    corners = [(0, 0), (width, 0), (0, height), (width, height)]
+    radius = max(math.hypot(x - cx, y - cy) for x, y in corners) or 1.0
+    return _lookup(t / radius, stops)
+
+
+def _render(kind, width, height, stops, param):
+    if kind == "linear":
+        array = _render_linear(width, height, stops, param)
+    elif kind == "radial":
+        array = _render_radial(width, height, stops, param)
+    else:
+        raise ValueError(f"Unknown gradient kind: {kind}")
+    return Image.fromarray(array, "RGB")
+
+
+def _cached(kind, width, height, colors, param):
+    global _cache_bytes
+    key = (kind, int(width), int(height), normalize_stops(colors), param)
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[0].copy()
+        _stats["misses"] += 1
+
+    image = _render(kind, key[1], key[2], key[3], param)
+    size = key[1] * key[2] * 3
+    if size <= CACHE_MAX_BYTES:
+        with _cache_lock:
+            if key not in _cache:
+                _cache[key] = (image, size)
+                _cache_bytes += size
+            while _cache_bytes > CACHE_MAX_BYTES and _cache:
+                _, (_, evicted_size) = _cache.popitem(last=False)
+                _cache_bytes -= evicted_size
+    return image.copy()
+
+
+def linear_gradient(width, height, colors, angle=90):
+    """Linear gradient; angle 90 runs top to bottom, 0 runs left to right."""
+    return _cached("linear", width, height, colors, float(angle) % 360)
+
+
+def radial_gradient(width, height, colors, center=(0.5, 0.5)):
+    """Radial gradient from the first stop at `center` to the last at the farthest corner."""
+    return _cached("radial", width, height, colors, (float(center[0]), float(center[1])))
+
+
+def cache_info():
+    with _cache_lock:
+        return {**_stats, "entries": len(_cache), "bytes": _cache_bytes}
+
+
+def clear_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+        _stats["hits"] = _stats["misses"] = 0
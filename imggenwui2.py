@@ -6,9 +6,20 @@ import streamlit as st
 st.set_page_config(page_title="AI Image Studio (Diagnostic)", page_icon="🔍", layout="wide")
 
 from PIL import Image
-import contextlib, io, torch, os, glob
+import torch, os, glob, time
 from pathlib import Path
 
+import cpu_profile
+import encoding
+import latency_budget
+import low_memory
+from model_index import ModelIndex
+from model_pool import ModelPool
+from progress import ProgressReporter, streamlit_bar
+from prompt_cache import PromptEmbeddingCache
+import status_server
+import tracing
+
 # ---------------------------------------------------------------------
 # ⚠️  HARD DEPENDENCY CHECK
 # ---------------------------------------------------------------------
@@ -29,7 +40,24 @@ except ModuleNotFoundError:
 # ---------------------------------------------------------------------
 # 🔍 MODEL FINDER FUNCTIONS
 # ---------------------------------------------------------------------
-def find_cached_models():
+MODEL_PATTERNS = [
+    "*stable-diffusion*",
+    "*runwayml*",
+    "models--*stable-diffusion*",
+    "models--runwayml--stable-diffusion*"
+]
+
+MODEL_INDICATORS = [
+    'model_index.json', 'unet/config.json', 'vae/config.json',
+    'text_encoder/config.json', 'unet', 'vae', 'text_encoder',
+    'tokenizer', 'scheduler'
+]
+
+model_index = ModelIndex()
+
+
+@tracing.stage("find_cached_models")
+def find_cached_models(refresh=False):
     st.write("🔍 **Searching for cached models...**")
 
     possible_locations = [
@@ -41,6 +69,7 @@ def find_cached_models():
     ]
 
     found_models = []
+    seen = set()
     for base_path in possible_locations:
         if os.path.exists(base_path):
             st.write(f"✅ Found directory: `{os.path.normpath(base_path)}`")
@@ -50,42 +79,36 @@ def find_cached_models():
             except Exception as e:
                 st.write(f"   ❌ Can't list contents: {e}")
 
-            patterns = [
-                "*stable-diffusion*",
-                "*runwayml*",
-                "models--*stable-diffusion*",
-                "models--runwayml--stable-diffusion*"
-            ]
-
-            for pattern in patterns:
-                matches = glob.glob(os.path.join(base_path, "**", pattern), recursive=True)
-                for match in matches:
-                    if os.path.isdir(match):
-                        st.write(f"🔍 Checking potential model: `{os.path.normpath(match)}`")
-                        try:
-                            model_contents = os.listdir(match)
-                            st.write(f"   📁 Model contents: {model_contents}")
-                        except Exception as e:
-                            st.write(f"   ❌ Can't list model contents: {e}")
-
-                        indicators = [
-                            'model_index.json', 'unet/config.json', 'vae/config.json',
-                            'text_encoder/config.json', 'unet', 'vae', 'text_encoder',
-                            'tokenizer', 'scheduler'
-                        ]
-
-                        valid = [i for i in indicators if os.path.exists(os.path.join(match, i))]
-                        if valid:
-                            found_models.append({'path': match, 'indicators': valid})
-                            st.write(f"🎯 **Found model at:** `{os.path.normpath(match)}`")
-                            st.write(f"   - Has: {', '.join(valid)}")
-                        else:
-                            st.write("   ⚠️ Directory found but no model indicators")
+            candidates, from_index = model_index.lookup(base_path, MODEL_PATTERNS, MODEL_INDICATORS, refresh)
+            if from_index:
+                st.write("   ⚡ Unchanged since last scan, using model index")
+            else:
+                st.write(f"   🔄 Scanned up to {model_index.max_depth} levels deep")
+
+            for candidate in candidates:
+                match, valid = candidate['path'], candidate['indicators']
+                if match in seen:
+                    continue
+                seen.add(match)
+                st.write(f"🔍 Checking potential model: `{os.path.normpath(match)}`")
+                if valid:
+                    found_models.append({'path': match, 'indicators': valid})
+                    st.write(f"🎯 **Found model at:** `{os.path.normpath(match)}`")
+                    st.write(f"   - Has: {', '.join(valid)}")
+                else:
+                    st.write("   ⚠️ Directory found but no model indicators")
         else:
             st.write(f"❌ Directory not found: `{os.path.normpath(base_path)}`")
     return found_models
 
 
+@st.cache_resource(show_spinner=False)
+def get_model_pool():
+    # Survives reruns; pipelines loaded through it share identical components
+    return ModelPool()
+
+
+@tracing.stage("test_model_loading")
 def test_model_loading(model_path):
     st.write(f"🧪 **Testing model loading from:** `{os.path.normpath(model_path)}`")
     try:
@@ -93,7 +116,7 @@ def test_model_loading(model_path):
         dtype = torch.float16 if device == "cuda" else torch.float32
 
         st.write("   - Trying direct path loading...")
-        pipe = StableDiffusionPipeline.from_pretrained(
+        pipe = get_model_pool().get(
             model_path, torch_dtype=dtype, local_files_only=True
         )
         st.success(f"✅ Successfully loaded model from {os.path.normpath(model_path)}")
@@ -105,7 +128,7 @@ def test_model_loading(model_path):
             if snapshots:
                 latest = max(snapshots, key=os.path.getctime)
                 st.write(f"   - Trying snapshot folder: `{os.path.normpath(latest)}`")
-                pipe = StableDiffusionPipeline.from_pretrained(
+                pipe = get_model_pool().get(
                     latest, torch_dtype=dtype, local_files_only=True
                 )
                 st.success(f"✅ Loaded from snapshot: {os.path.normpath(latest)}")
@@ -125,10 +148,10 @@ def load_pipeline_smart():
         device = "cuda" if torch.cuda.is_available() else "cpu"
         dtype = torch.float16 if device == "cuda" else torch.float32
         with st.spinner("Downloading model..."):
-            pipe = StableDiffusionPipeline.from_pretrained(
+            pipe = get_model_pool().get(
                 "runwayml/stable-diffusion-v1-5", torch_dtype=dtype
             )
-        return pipe.to(device)
+        return cpu_profile.optimize(pipe.to(device))
 
     for info in found:
         pipe, method = test_model_loading(info['path'])
@@ -138,29 +161,72 @@ def load_pipeline_smart():
             if hasattr(pipe, "safety_checker"):
                 pipe.safety_checker = lambda imgs, **kwargs: (imgs, False)
             st.success(f"🎉 Using model loaded via {method} method!")
-            return pipe
+            return cpu_profile.optimize(pipe)
 
     st.warning("⚠️ Local models found but couldn't load. Downloading...")
     device = "cuda" if torch.cuda.is_available() else "cpu"
     dtype = torch.float16 if device == "cuda" else torch.float32
     with st.spinner("Downloading model..."):
-        pipe = StableDiffusionPipeline.from_pretrained(
+        pipe = get_model_pool().get(
             "runwayml/stable-diffusion-v1-5", torch_dtype=dtype
         )
-    return pipe.to(device)
+    return cpu_profile.optimize(pipe.to(device))
 
 
-def generate_image(prompt: str, guidance_scale: float = 7.5, steps: int = 30, seed: int | None = None):
+@st.cache_resource(show_spinner=False)
+def get_prompt_cache():
+    return PromptEmbeddingCache()
+
+
+@tracing.request_trace("generate_image")
+def generate_image(prompt: str, guidance_scale: float = 7.5, steps: int = 30, seed: int | None = None,
+                   progress=None):
+    """`progress(fraction, message)` is called after every denoising step."""
     pipe = load_pipeline_smart()
     device = pipe.device
     gen = torch.Generator(device=device).manual_seed(seed) if seed else None
-    with torch.autocast(device.type) if device.type == "cuda" else contextlib.nullcontext():
-        out = pipe(prompt, guidance_scale=guidance_scale, num_inference_steps=steps, generator=gen)
-    return out.images[0]
+    prompt_cache = get_prompt_cache()
+    prompt_embeds = prompt_cache.encode(pipe, prompt)
+    # The pipeline's own unconditional input is the empty prompt
+    negative_embeds = prompt_cache.encode(pipe, "", pin=True)
+    model_key = prompt_cache.model_key(pipe)
+    step_timer = tracing.StepTimer(model=model_key)
+    step_times = []
+
+    def on_step(pipe, step, timestep, callback_kwargs):
+        step_timer.tick()
+        step_times.append(time.perf_counter())
+        if progress is not None:
+            progress((step + 1) / steps, f"Denoising — step {step + 1}/{steps}")
+        return callback_kwargs
+
+    started = time.perf_counter()
+    with tracing.stage("diffusion"), \
+            torch.autocast(device.type) if device.type == "cuda" else cpu_profile.inference_context(pipe):
+        out = pipe(
+            prompt_embeds=prompt_embeds,
+            negative_prompt_embeds=negative_embeds,
+            guidance_scale=guidance_scale,
+            num_inference_steps=steps,
+            generator=gen,
+            callback_on_step_end=on_step
+        )
+    image = out.images[0]
+    # What the step slider costs on this host, for the estimate next to it
+    if len(step_times) >= 2:
+        per_step = (step_times[-1] - step_times[0]) / (len(step_times) - 1)
+        overhead = (time.perf_counter() - started) - per_step * len(step_times)
+        latency_budget.estimator.observe(model_key, image.width, image.height, per_step, overhead)
+    low_memory.release_text_encoder(pipe, prompt_cache)
+    st.session_state.diag_model_key = model_key
+    st.session_state.diag_image_size = image.size
+    return image
 
 # ---------------------------------------------------------------------
 # 🎨 STREAMLIT UI
 # ---------------------------------------------------------------------
+status_server.start(port=int(os.getenv("POSTER_DIAG_STATUS_PORT", "7862")))
+
 st.title("🔍 AI Image Studio - Diagnostic Mode")
 st.write("This version helps find and use your local Stable Diffusion installation.")
 
@@ -173,13 +239,20 @@ with col1:
 with col2:
     st.write(f"**PyTorch Version:** {torch.__version__}")
     st.write(f"**Device:** {'CUDA' if torch.cuda.is_available() else 'CPU'}")
+    st.write(f"**Inference profile:** {cpu_profile.PROFILE}")
+    if low_memory.ENABLED:
+        lm = low_memory.stats()
+        st.write(f"**Low-memory mode:** {lm['mapped_bytes'] / 2**20:.0f} MB mapped, "
+                 f"{lm['private_bytes_saved'] / 2**20:.0f} MB private memory saved, "
+                 f"{lm['releases']} text encoder releases")
 
 st.divider()
 
 st.subheader("🔍 Model Diagnostics")
+rescan = st.checkbox("Ignore model index and rescan", value=False)
 if st.button("🔍 Search for Models", type="primary"):
     with st.spinner("Searching for models..."):
-        models = find_cached_models()
+        models = find_cached_models(refresh=rescan)
     if models:
         st.success(f"Found {len(models)} potential model(s)!")
         for i, m in enumerate(models):
@@ -191,28 +264,45 @@ st.divider()
 
 st.subheader("🎨 Generate Image")
 prompt = st.text_area("Enter your prompt:", "a beautiful sunset over mountains", height=100)
+quality = st.radio("Quality", ["custom"] + list(latency_budget.PRESETS) + [latency_budget.DEADLINE], horizontal=True)
+# The pipeline renders at its native size; presets only set the step count here
+est_model = st.session_state.get("diag_model_key")
+est_width, est_height = st.session_state.get("diag_image_size", (512, 512))
 col1, col2, col3 = st.columns(3)
 with col1:
-    steps = st.slider("Steps", 10, 50, 20)
+    if quality == "custom":
+        steps = st.slider("Steps", 10, 50, 20)
+    elif quality == latency_budget.DEADLINE:
+        deadline = st.slider("Deadline (seconds)", 5, 300, 60)
+        steps = latency_budget.steps_for_deadline(est_model, est_width, est_height, deadline)
+    else:
+        steps = latency_budget.PRESETS[quality][0]
+    estimate = latency_budget.estimator.estimate(est_model, est_width, est_height, steps)
+    st.caption(f"{steps} steps ≈ {estimate:.1f}s at {est_width}×{est_height} on this host"
+               + ("" if latency_budget.measured() else " (rough guess until the first image is timed)"))
 with col2:
     guidance = st.slider("Guidance", 1.0, 20.0, 7.5)
 with col3:
     seed = st.number_input("Seed (0 for random)", 0, 1000000, 0)
+download_format = st.selectbox("Download format", list(encoding.FORMATS),
+                               index=list(encoding.FORMATS).index(encoding.DEFAULT_FORMAT))
 
 if st.button("🚀 Generate Image", type="primary"):
     if prompt.strip():
         try:
-            with st.spinner("Generating image..."):
-                seed_val = None if seed == 0 else seed
-                image = generate_image(prompt, guidance, steps, seed_val)
-            st.image(image, caption="Generated Image", use_column_width=True)
-            buf = io.BytesIO()
-            image.save(buf, format="PNG")
+            seed_val = None if seed == 0 else seed
+            bar = st.progress(0.0, text="Preparing model...")
+            image = generate_image(prompt, guidance, steps, seed_val, progress=ProgressReporter(streamlit_bar(bar)))
+            bar.empty()
+            key = encoding.image_key(image)
+            preview = encoding.encode(image, key=key)
+            download = encoding.encode(image, download_format, key=key)
+            st.image(preview.data, caption="Generated Image", use_column_width=True)
             st.download_button(
                 "📅 Download Image",
-                data=buf.getvalue(),
-                file_name="generated_image.png",
-                mime="image/png"
+                data=download.data,
+                file_name=f"generated_image.{download.extension}",
+                mime=download.mime
             )
         except Exception as e:
             st.error(f"❌ Generation failed: {str(e)}")
@@ -0,0 +1,152 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, abandon_after=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Waiting in queue"
+        self.result = None
+        self.error = None
+        self.created = time.monotonic()
+        self.last_seen = self.created
+        self.abandon_after = abandon_after
+        self._phase = (0.0, 1.0)
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    def phase(self, start, end):
+        """Map the progress reported from now on into [start, end] of the whole job."""
+        self._phase = (start, end)
+
+    def report(self, done, total=None, message=None):
+        """Record progress as a fraction, or as `done` out of `total` steps, of the current phase."""
+        fraction = min(1.0, done / total if total else float(done))
+        start, end = self._phase
+        self.progress = start + (end - start) * fraction
+        if message is not None:
+            self.message = message
+        if self.should_stop():
+            raise JobCancelled(self.id)
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def should_stop(self):
+        if self._cancel.is_set():
+            return True
+        if self.abandon_after and time.monotonic() - self.last_seen > self.abandon_after:
+            # Nobody has polled this job for a while; the client is gone
+            self._cancel.set()
+            return True
+        return False
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def snapshot(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "message": self.message,
+            "error": str(self.error) if self.error else None,
+        }
+
+
+class JobManager:
+    """Bounded worker pool for long-running generation jobs.
+
+    `submit(fn, *args)` calls `fn(*args, job=job)` on a worker thread. The
+    function reports progress through `job.report(...)`, which raises
+    JobCancelled once the job has been cancelled or abandoned. Submissions
+    beyond `max_queue` outstanding jobs are rejected immediately.
+    """
+
+    def __init__(self, max_workers=2, max_queue=16, abandon_after=60.0, keep_finished=200):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.abandon_after = abandon_after
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="poster-job")
+        self._jobs = OrderedDict()
+        self._outstanding = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        job = Job(self.abandon_after)
+        with self._lock:
+            if self._outstanding >= self.max_queue:
+                raise JobQueueFull(f"{self._outstanding} jobs already queued or running")
+            self._outstanding += 1
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        try:
+            if job.should_stop():
+                raise JobCancelled(job.id)
+            job.status = RUNNING
+            job.message = "Starting"
+            job.result = fn(*args, job=job, **kwargs)
+            job.status = DONE
+            job.progress = 1.0
+            job.message = "Done"
+        except JobCancelled:
+            job.status = CANCELLED
+            job.message = "Cancelled"
+        except Exception as e:
+            job.status = FAILED
+            job.error = e
+            job.message = f"Failed: {e}"
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+            job._done.set()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def queue_depth(self):
+        with self._lock:
+            return self._outstanding
@@ -0,0 +1,150 @@
+import os
+import threading
+from collections import namedtuple
+
+# Fixed quality levels: steps, and the fraction of the requested resolution
+# to diffuse at (the result is upscaled back to the requested size)
+PRESETS = {
+    "draft": (12, 0.75),
+    "standard": (25, 1.0),
+    "final": (35, 1.0),
+}
+DEADLINE = "deadline"
+
+MIN_STEPS = int(os.getenv("POSTER_MIN_STEPS", "8"))
+# Below this many steps a smaller image at more steps looks better than a
+# full-size one, so the planner gives up resolution first
+GOOD_STEPS = int(os.getenv("POSTER_GOOD_STEPS", "20"))
+MAX_STEPS = int(os.getenv("POSTER_MAX_STEPS", "35"))
+RESOLUTION_SCALES = (1.0, 0.875, 0.75, 0.625, 0.5)
+# Seconds per step per megapixel of output, used until the host has been measured
+PRIOR_STEP_SECONDS_PER_MP = float(os.getenv("POSTER_STEP_SECONDS_PER_MP", "4.0"))
+PRIOR_OVERHEAD_SECONDS = 2.0
+# Weight of the newest observation in the rolling averages
+SMOOTHING = 0.3
+
+# steps and diffusion size; scale < 1 means the background is upscaled afterwards
+Plan = namedtuple("Plan", ["steps", "width", "height", "estimated_seconds"])
+
+
+def scaled_size(width, height, scale):
+    """Diffusion size for a resolution scale, in the multiples of 8 the UNet needs."""
+    return max(64, int(width * scale) // 8 * 8), max(64, int(height * scale) // 8 * 8)
+
+
+class StepTimeEstimator:
+    """Rolling per-step and fixed-overhead timings per model, resolution and batch size.
+
+    A batched step denoises every image in the batch, so it is timed apart
+    from single renders. Combinations that have not been run yet are
+    estimated from the measured one nearest in pixels times batch size,
+    scaled by that; before anything has run on this host a conservative
+    prior is used.
+    """
+
+    def __init__(self):
+        self._steps = {}
+        self._overhead = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _blend(table, key, value):
+        old = table.get(key)
+        table[key] = value if old is None else (1 - SMOOTHING) * old + SMOOTHING * value
+
+    def observe(self, model_id, width, height, step_seconds, overhead_seconds=None, batch_size=1):
+        key = (model_id, width, height, batch_size)
+        with self._lock:
+            self._blend(self._steps, key, step_seconds)
+            if overhead_seconds is not None:
+                self._blend(self._overhead, key, max(0.0, overhead_seconds))
+
+    def _nearest(self, table, model_id, width, height, batch_size):
+        pixels = width * height * batch_size
+        candidates = [(abs(w * h * b - pixels), w * h * b, value) for (m, w, h, b), value in table.items() if m == model_id]
+        if not candidates:
+            candidates = [(abs(w * h * b - pixels), w * h * b, value) for (_, w, h, b), value in table.items()]
+        if not candidates:
+            return None
+        _, measured_pixels, value = min(candidates)
+        return value * pixels / measured_pixels
+
+    def step_seconds(self, model_id, width, height, batch_size=1):
+        with self._lock:
+            exact = self._steps.get((model_id, width, height, batch_size))
+            if exact is not None:
+                return exact
+            nearest = self._nearest(self._steps, model_id, width, height, batch_size)
+        if nearest is not None:
+            return nearest
+        return PRIOR_STEP_SECONDS_PER_MP * width * height * batch_size / 1e6
+
+    def overhead_seconds(self, model_id, width, height, batch_size=1):
+        with self._lock:
+            exact = self._overhead.get((model_id, width, height, batch_size))
+            if exact is not None:
+                return exact
+            nearest = self._nearest(self._overhead, model_id, width, height, batch_size)
+        return PRIOR_OVERHEAD_SECONDS if nearest is None else nearest
+
+    def estimate(self, model_id, width, height, steps, batch_size=1):
+        return (self.overhead_seconds(model_id, width, height, batch_size)
+                + steps * self.step_seconds(model_id, width, height, batch_size))
+
+    def snapshot(self):
+        with self._lock:
+            return [
+                {"model": m, "width": w, "height": h, "batch_size": b, "step_seconds": round(v, 4),
+                 "overhead_seconds": round(self._overhead.get((m, w, h, b), 0.0), 4)}
+                for (m, w, h, b), v in self._steps.items()
+            ]
+
+
+estimator = StepTimeEstimator()
+
+
+def _affordable_steps(model_id, width, height, seconds, estimator):
+    step = estimator.step_seconds(model_id, width, height)
+    if step <= 0:
+        return MAX_STEPS
+    return min(MAX_STEPS, int((seconds - estimator.overhead_seconds(model_id, width, height)) / step))
+
+
+def steps_for_deadline(model_id, width, height, seconds, estimator=estimator):
+    """Steps affordable in `seconds` at a fixed size, clamped to MIN_STEPS..MAX_STEPS."""
+    return max(MIN_STEPS, _affordable_steps(model_id, width, height, seconds, estimator))
+
+
+def measured(estimator=estimator):
+    """True once this host has timed at least one run the estimates can scale from."""
+    return bool(estimator.snapshot())
+
+
+def plan_for_deadline(model_id, width, height, seconds, estimator=estimator):
+    """Largest resolution and step count whose estimated time fits in `seconds`.
+
+    Full resolution is kept while it still affords GOOD_STEPS; after that the
+    resolution drops before the steps do. If nothing fits, the cheapest
+    acceptable render (smallest size at MIN_STEPS) is returned.
+    """
+    fallback = None
+    for scale in RESOLUTION_SCALES:
+        w, h = scaled_size(width, height, scale)
+        steps = _affordable_steps(model_id, w, h, seconds, estimator)
+        if steps >= GOOD_STEPS:
+            return Plan(steps, w, h, estimator.estimate(model_id, w, h, steps))
+        if steps >= MIN_STEPS and (fallback is None or steps > fallback.steps):
+            fallback = Plan(steps, w, h, estimator.estimate(model_id, w, h, steps))
+    if fallback is not None:
+        return fallback
+    w, h = scaled_size(width, height, RESOLUTION_SCALES[-1])
+    return Plan(MIN_STEPS, w, h, estimator.estimate(model_id, w, h, MIN_STEPS))
+
+
+def plan(quality, model_id, width, height, deadline=None, elapsed=0.0, estimator=estimator):
+    """Steps and diffusion size for a quality preset, or for `deadline` seconds minus time already spent."""
+    if quality == DEADLINE and deadline:
+        return plan_for_deadline(model_id, width, height, max(0.0, deadline - elapsed), estimator)
+    steps, scale = PRESETS.get(quality, PRESETS["final"])
+    w, h = scaled_size(width, height, scale)
+    return Plan(steps, w, h, estimator.estimate(model_id, w, h, steps))
@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+from PIL import Image
+
+# Premultiplied masters are kept at up to this size, so even a print-size
+# logo variant never has to decode or convert the upload again
+MASTER_MAX_SIDE = 2048
+MASTER_CACHE_BYTES = 64 * 1024 * 1024
+MAX_VARIANTS = 128
+
+_masters = OrderedDict()
+_masters_bytes = 0
+_variants = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "master_hits": 0}
+# (weak reference to the last image hashed, its key): prescale and print
+# renders ask for several sizes of the same upload in a row
+_last_key = (None, None)
+
+
+def logo_key(image):
+    """Content hash of an uploaded logo; the same brand re-uploaded hashes the same."""
+    global _last_key
+    ref, key = _last_key
+    if ref is not None and ref() is image:
+        return key
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size}".encode("utf-8"))
+    digest.update(image.tobytes())
+    if image.mode == "P":
+        digest.update(bytes(image.getpalette() or ()))
+        digest.update(repr(image.info.get("transparency")).encode("utf-8"))
+    key = digest.hexdigest()
+    _last_key = (weakref.ref(image), key)
+    return key
+
+
+def _premultiply(image):
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    master = image.convert("RGBa")
+    if max(master.size) > MASTER_MAX_SIDE:
+        master.thumbnail((MASTER_MAX_SIDE, MASTER_MAX_SIDE), Image.Resampling.LANCZOS)
+    return master
+
+
+def _master(key, image):
+    global _masters_bytes
+    with _lock:
+        master = _masters.get(key)
+        if master is not None:
+            _masters.move_to_end(key)
+            _stats["master_hits"] += 1
+            return master
+
+    master = _premultiply(image)
+    size = master.width * master.height * 4
+    with _lock:
+        if key not in _masters:
+            _masters[key] = master
+            _masters_bytes += size
+        while _masters_bytes > MASTER_CACHE_BYTES and len(_masters) > 1:
+            _, evicted = _masters.popitem(last=False)
+            _masters_bytes -= evicted.width * evicted.height * 4
+    return master
+
+
+def _scale(master, max_size):
+    # Resampling premultiplied pixels keeps transparent edges from going dark;
+    # Pillow would otherwise premultiply on every resize of an RGBA image
+    scaled = master.copy()
+    scaled.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    logo = scaled.convert("RGBA")
+    if logo.getextrema()[3][0] == 255:
+        # Fully opaque: an RGB layer pastes without a blend mask
+        logo = logo.convert("RGB")
+    return logo
+
+
+def prepared_logo(image, max_size):
+    """Logo fitted within `max_size`, ready to paste (RGBA, or RGB when opaque).
+
+    Results are cached by content hash and size and shared between callers,
+    so treat them as read-only.
+    """
+    key = logo_key(image)
+    with _lock:
+        logo = _variants.get((key, max_size))
+        if logo is not None:
+            _variants.move_to_end((key, max_size))
+            _stats["hits"] += 1
+            return logo
+        _stats["misses"] += 1
+
+    logo = _scale(_master(key, image), max_size)
+    with _lock:
+        _variants[(key, max_size)] = logo
+        while len(_variants) > MAX_VARIANTS:
+            _variants.popitem(last=False)
+    return logo
+
+
+def prescale(image, max_sizes):
+    """Warm the cache with every size a poster layout may ask for."""
+    return {size: prepared_logo(image, size) for size in sorted(set(max_sizes))}
+
+
+def cache_info():
+    with _lock:
+        return {**_stats, "variants": len(_variants), "masters": len(_masters), "master_bytes": _masters_bytes}
@@ -0,0 +1,249 @@
+"""Low-memory model loading: weights served straight from the safetensors files.
+
+With POSTER_LOW_MEMORY=1 every parameter that matches the checkpoint file
+from_pretrained loaded (same dtype, shape and values, plain contiguous layout)
+is swapped for a view into a copy-on-write mmap of that safetensors file, and
+the private copy is freed. The pages then belong to the page cache, so every
+worker on the host shares one copy. Checking the values reads every mapped
+page once, so the verified pages are dropped from this process again straight
+away: afterwards only what inference actually touches becomes resident, and
+submodules that never run (the VAE encoder, unless print tiles are refined)
+stay out of RSS. Weights converted on load (fp16 files for an fp32 pipeline,
+channels-last convolutions) stay private.
+
+Mapped pages can also be handed back to the kernel with `release`; the next
+forward pass faults them in again from the file, so nothing has to reload.
+"""
+import gc
+import json
+import mmap
+import os
+import struct
+import threading
+import weakref
+
+import torch
+
+ENABLED = os.getenv("POSTER_LOW_MEMORY", "0") == "1"
+# Consecutive prompt cache hits before the text encoder's pages are released
+RELEASE_AFTER_HITS = int(os.getenv("POSTER_RELEASE_AFTER_HITS", "8"))
+COMPONENTS = ("unet", "vae", "text_encoder")
+# Weight file stems written by diffusers models and transformers text encoders
+WEIGHT_STEMS = ("diffusion_pytorch_model", "model")
+
+DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+# module -> its mmaps; the tensors keep the mappings alive, this only finds them again
+_maps = weakref.WeakKeyDictionary()
+# text encoder -> prompt cache miss count when it was last released
+_released_at = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+_stats = {"mapped_bytes": 0, "private_bytes_saved": 0, "released_bytes": 0, "releases": 0}
+
+
+def memory_usage():
+    """Resident bytes of this process: VmRSS, RssAnon (private) and RssFile (shareable); {} off Linux."""
+    usage = {}
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in ("VmRSS", "RssAnon", "RssFile"):
+                    usage[name] = int(value.split()[0]) * 1024
+    except OSError:
+        pass
+    return usage
+
+
+def _model_root(model_id):
+    if os.path.isdir(model_id):
+        return model_id
+    try:
+        from huggingface_hub import snapshot_download
+        # from_pretrained has just fetched it, so the local cache is enough
+        return snapshot_download(model_id, local_files_only=True)
+    except Exception as e:
+        print(f"⚠️ Low-memory mode: no local snapshot of {model_id} ({e})")
+        return None
+
+
+def _with_variant(filename, variant):
+    # Same naming as diffusers/transformers: the variant goes before the last extension
+    if not variant:
+        return filename
+    parts = filename.split(".")
+    return ".".join(parts[:-1] + [variant, parts[-1]])
+
+
+def weight_files(directory, variant=None):
+    """The safetensors files from_pretrained loads for a component, [] if it loaded something else.
+
+    Only the main file (or the shards its index names) for the requested
+    variant; the non_ema and fp16 files that sit next to it in stock
+    checkpoints hold different weights of the same shapes.
+    """
+    for stem in WEIGHT_STEMS:
+        single = os.path.join(directory, _with_variant(f"{stem}.safetensors", variant))
+        if os.path.isfile(single):
+            return [single]
+        index = os.path.join(directory, _with_variant(f"{stem}.safetensors.index.json", variant))
+        if os.path.isfile(index):
+            with open(index, "r", encoding="utf-8") as f:
+                shards = sorted(set(json.load(f)["weight_map"].values()))
+            return [os.path.join(directory, shard) for shard in shards]
+    return []
+
+
+def _map_file(path, params, remaining):
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    mapped = 0
+    mismatched = []
+    tensor = None
+    for name, info in header.items():
+        if name == "__metadata__" or name not in remaining:
+            continue
+        param = params[name]
+        start, end = info["data_offsets"]
+        if (DTYPES.get(info["dtype"]) != param.dtype or tuple(info["shape"]) != tuple(param.shape)
+                or param.device.type != "cpu" or not param.is_contiguous() or end == start):
+            continue
+        tensor = torch.frombuffer(
+            mm, dtype=param.dtype, count=param.numel(), offset=8 + header_size + start
+        ).view(param.shape)
+        # Never swap in different numbers, whatever the file claims to be
+        if not torch.equal(tensor, param.data):
+            mismatched.append(name)
+            continue
+        param.data = tensor
+        remaining.discard(name)
+        mapped += end - start
+    if mismatched:
+        print(f"⚠️ Low-memory mode: {len(mismatched)} tensors in {os.path.basename(path)} differ from the "
+              f"loaded weights (e.g. {mismatched[0]}); keeping private copies of those")
+    if not mapped:
+        tensor = None  # the last view must go before the mapping can close
+        mm.close()
+        return None, 0
+    return mm, mapped
+
+
+def _map_module(module, directory, variant=None):
+    params = dict(module.named_parameters())
+    remaining = set(params)
+    maps = []
+    mapped = 0
+    for path in weight_files(directory, variant):
+        if not remaining:
+            break
+        mm, size = _map_file(path, params, remaining)
+        if mm is not None:
+            maps.append(mm)
+            mapped += size
+    if maps:
+        _maps[module] = maps
+    return mapped
+
+
+def map_weights(pipe, model_id, variant=None):
+    """Back the pipeline's weights with mmaps of the safetensors files it was loaded from; returns bytes mapped.
+
+    Pass the `variant` given to from_pretrained, if any.
+    """
+    root = _model_root(model_id)
+    if root is None:
+        return 0
+    before = memory_usage().get("RssAnon")
+    mapped = 0
+    names = []
+    modules = []
+    for name in COMPONENTS:
+        module = getattr(pipe, name, None)
+        # Components shared with an already loaded model are mapped already
+        if not isinstance(module, torch.nn.Module) or module in _maps:
+            continue
+        size = _map_module(module, os.path.join(root, name), variant)
+        if size:
+            mapped += size
+            names.append(name)
+            modules.append(module)
+    if not mapped:
+        print(f"⚠️ Low-memory mode: no matching safetensors weights for {model_id}, keeping private copies")
+        return 0
+
+    # Drop the private copies from_pretrained made, and the mapped pages the
+    # value check faulted in; inference faults back only what it uses
+    gc.collect()
+    for module in modules:
+        _drop_pages(_maps[module])
+    after = memory_usage().get("RssAnon")
+    saved = max(0, before - after) if before is not None and after is not None else 0
+    with _lock:
+        _stats["mapped_bytes"] += mapped
+        _stats["private_bytes_saved"] += saved
+    print(f"🗺️ {model_id}: mapped {', '.join(names)} ({mapped / 2**20:.0f} MB), "
+          f"private memory down {saved / 2**20:.0f} MB")
+    return mapped
+
+
+def _drop_pages(maps):
+    if not hasattr(mmap, "MADV_DONTNEED"):
+        return False
+    for mm in maps:
+        mm.madvise(mmap.MADV_DONTNEED)
+    return True
+
+
+def release(module, name="module"):
+    """Hand a mapped module's resident pages back to the kernel; returns the RSS drop.
+
+    The mappings are copy-on-write but the weights are never written, so the
+    pages are clean and simply re-read from the file on next use.
+    """
+    maps = _maps.get(module)
+    if not maps:
+        return 0
+    before = memory_usage().get("VmRSS")
+    if not _drop_pages(maps):
+        return 0
+    after = memory_usage().get("VmRSS")
+    dropped = max(0, before - after) if before is not None and after is not None else 0
+    with _lock:
+        _stats["released_bytes"] += dropped
+        _stats["releases"] += 1
+    print(f"🪶 Released {name} pages ({dropped / 2**20:.0f} MB resident freed)")
+    return dropped
+
+
+def release_text_encoder(pipe, prompt_cache, min_hits=RELEASE_AFTER_HITS):
+    """Release the text encoder once `prompt_cache` has answered `min_hits` lookups in a row.
+
+    Released at most once per cache miss: a miss runs the encoder and faults
+    its pages back in, and the next warm streak releases them again.
+    """
+    encoder = getattr(pipe, "text_encoder", None)
+    if not ENABLED or encoder is None or not prompt_cache.warm(min_hits):
+        return 0
+    with _lock:
+        if _released_at.get(encoder) == prompt_cache.misses:
+            return 0
+        _released_at[encoder] = prompt_cache.misses
+    return release(encoder, "text_encoder")
+
+
+def stats():
+    with _lock:
+        return {**_stats, "enabled": int(ENABLED), "mapped_modules": len(_maps)}
@@ -0,0 +1,163 @@
+"""Mail-merge posters: one background, many text variants.
+
+    python mail_merge.py template.json variants.csv --out posters/
+
+The template (JSON) sets the shared inputs: prompt, aspect_ratio, logo (file
+path), model_id, seed, quality (a preset: draft, standard or final). Each variants row (CSV or JSONL) sets id, subtitle and
+details. The background, darkening and logo are rendered once into a base
+layer (cached across runs); worker processes load that base once and only
+stamp text and encode, so 500 variants cost one diffusion run. Finished ids
+go to <out>/checkpoint.txt, as with batch_render.py.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+import encoding
+import poster_layout
+from batch_render import CHECKPOINT_NAME, FAILURES_NAME, load_app, read_checkpoint, read_manifest, row_id
+
+BASE_NAME = "template_base.png"
+
+_base = None
+
+
+def _init_worker(base_path):
+    # Once per worker process: decode the shared base layer (the app itself is never imported here)
+    global _base
+    with Image.open(base_path) as img:
+        _base = img.convert("RGB")
+
+
+def stamp_rows(rows, out_dir, fmt):
+    """Worker stage: stamp, encode and write a chunk of variants; [(id, error or None)]."""
+    results = []
+    for rid, row in rows:
+        try:
+            poster = poster_layout.stamp_text(_base, row.get("subtitle", ""), row.get("details", ""))
+            out_path = os.path.join(out_dir, f"{rid}.{encoding.FORMATS[fmt][2]}")
+            tmp_path = out_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(encoding.encode(poster, fmt).data)
+            os.replace(tmp_path, out_path)
+            results.append((rid, None))
+        except Exception as e:
+            results.append((rid, str(e)))
+    return results
+
+
+def render_base(template, out_dir):
+    app = load_app()
+    if not app.poster_gen.wait_until_ready():
+        print(f"⚠️ Model unavailable ({app.poster_gen.model_error}); using a gradient background")
+    logo = None
+    if template.get("logo"):
+        logo = Image.open(template["logo"])
+        logo.load()
+    started = time.perf_counter()
+    base = app.poster_gen.create_template_base(
+        template.get("prompt", ""),
+        template.get("aspect_ratio"),
+        logo,
+        seed=int(template.get("seed", app.DEFAULT_SEED)),
+        model_id=template.get("model_id"),
+        quality=template.get("quality")
+    )
+    # Lossless hand-off to the workers
+    path = os.path.join(out_dir, BASE_NAME)
+    with open(path + ".tmp", "wb") as f:
+        f.write(encoding.encode(base, "png").data)
+    os.replace(path + ".tmp", path)
+    print(f"🖼 Base layer {base.size[0]}x{base.size[1]} ready in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def run(template, variants, out_dir, workers, fmt, chunk_size, max_inflight):
+    os.makedirs(out_dir, exist_ok=True)
+    completed = read_checkpoint(out_dir)
+    base_path = render_base(template, out_dir)
+
+    done = failed = skipped = 0
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(max_inflight)
+    started = time.perf_counter()
+    context = multiprocessing.get_context("spawn")
+
+    with open(os.path.join(out_dir, CHECKPOINT_NAME), "a", encoding="utf-8") as checkpoint, \
+            open(os.path.join(out_dir, FAILURES_NAME), "a", encoding="utf-8") as failures, \
+            ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                initargs=(base_path,)) as pool:
+
+        def on_done(chunk, future):
+            nonlocal done, failed
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [(rid, str(e)) for rid, _ in chunk]
+            with lock:
+                for rid, error in results:
+                    if error is None:
+                        checkpoint.write(rid + "\n")
+                        done += 1
+                    else:
+                        failures.write(json.dumps({"id": rid, "error": error}) + "\n")
+                        failed += 1
+                        print(f"❌ {rid}: {error}")
+                checkpoint.flush()
+                failures.flush()
+            slots.release()
+
+        def submit(chunk):
+            slots.acquire()
+            future = pool.submit(stamp_rows, chunk, out_dir, fmt)
+            future.add_done_callback(lambda f: on_done(chunk, f))
+
+        chunk = []
+        for index, row in enumerate(read_manifest(variants)):
+            rid = row_id(index, row)
+            if rid in completed:
+                skipped += 1
+                continue
+            chunk.append((rid, row))
+            if len(chunk) == chunk_size:
+                submit(chunk)
+                chunk = []
+        if chunk:
+            submit(chunk)
+
+        for _ in range(max_inflight):
+            slots.acquire()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ {done} stamped, {failed} failed, {skipped} already done in {elapsed:.1f}s")
+    return failed == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stamp text variants onto one rendered poster template")
+    parser.add_argument("template", help="JSON file with prompt, aspect_ratio, logo, model_id, seed, quality")
+    parser.add_argument("variants", help="CSV or JSONL with id, subtitle, details")
+    parser.add_argument("--out", default="posters")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--format", choices=list(encoding.FORMATS), default="png")
+    parser.add_argument("--chunk-size", type=int, default=16, help="variants per worker task")
+    parser.add_argument("--max-inflight", type=int, default=None,
+                        help="chunks queued at once (default: 2 x workers)")
+    args = parser.parse_args(argv)
+
+    with open(args.template, "r", encoding="utf-8") as f:
+        template = json.load(f)
+    max_inflight = args.max_inflight or 2 * args.workers
+    ok = run(template, args.variants, args.out, args.workers, args.format, args.chunk_size, max_inflight)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
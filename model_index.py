@@ -0,0 +1,101 @@
+import fnmatch
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~/.cache"), "poster_generator", "model_index.json")
+DEFAULT_MAX_DEPTH = int(os.getenv("POSTER_MODEL_SCAN_DEPTH", "4"))
+
+
+class ModelIndex:
+    """Persisted manifest of model directories found under each search root.
+
+    A scan walks a root to `max_depth` and records the mtime of every directory
+    it listed. A later lookup only stats those directories: if none changed, no
+    entry was added or removed anywhere in the scanned tree and the stored
+    result is reused without listing anything.
+    """
+
+    def __init__(self, path=None, max_depth=DEFAULT_MAX_DEPTH):
+        self.path = path or os.getenv("POSTER_MODEL_INDEX", DEFAULT_INDEX_PATH)
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._entries = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self):
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _key(self, root, patterns, indicators):
+        raw = json.dumps([os.path.realpath(root), list(patterns), list(indicators), self.max_depth])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _unchanged(entry):
+        for directory, mtime in entry["dirs"].items():
+            try:
+                if os.stat(directory).st_mtime != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _scan(self, root, patterns, indicators):
+        dirs = {}
+        models = []
+        stack = [(os.path.realpath(root), 0)]
+        while stack:
+            directory, depth = stack.pop()
+            try:
+                dirs[directory] = os.stat(directory).st_mtime
+                children = [e for e in os.scandir(directory) if e.is_dir(follow_symlinks=False)]
+            except OSError:
+                continue
+            for child in children:
+                if any(fnmatch.fnmatch(child.name, p) for p in patterns):
+                    try:
+                        dirs[child.path] = os.stat(child.path).st_mtime
+                    except OSError:
+                        continue
+                    valid = [i for i in indicators if os.path.exists(os.path.join(child.path, i))]
+                    models.append({"path": child.path, "indicators": valid})
+                elif depth + 1 < self.max_depth and not child.name.startswith("."):
+                    stack.append((child.path, depth + 1))
+        models.sort(key=lambda m: m["path"])
+        return {"dirs": dirs, "models": models}
+
+    def lookup(self, root, patterns, indicators, refresh=False):
+        """Return (candidate directories, served_from_index) for one search root.
+
+        Candidates carry the indicators they have; an empty list means the
+        directory name matched but it does not look like a model.
+        """
+        key = self._key(root, patterns, indicators)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and not refresh and self._unchanged(entry):
+            return entry["models"], True
+
+        entry = self._scan(root, patterns, indicators)
+        with self._lock:
+            self._entries[key] = entry
+            self._write()
+        return entry["models"], False
@@ -0,0 +1,199 @@
+import gc
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import torch
+from diffusers import StableDiffusionPipeline
+
+import low_memory
+
+DEFAULT_BUDGET_MB = int(os.getenv("POSTER_MODEL_BUDGET_MB", "8192"))
+
+# Schedulers keep per-call state, so every pipeline gets its own
+UNSHARED_COMPONENTS = ("scheduler",)
+
+
+def component_bytes(component):
+    if isinstance(component, torch.nn.Module):
+        tensors = list(component.parameters()) + list(component.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    return 0
+
+
+def component_hash(component):
+    """Content hash of a pipeline component's weights (or vocabulary for tokenizers)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(type(component).__name__.encode("utf-8"))
+    if isinstance(component, torch.nn.Module):
+        for name, tensor in component.state_dict().items():
+            digest.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode("utf-8"))
+            if tensor.numel():
+                raw = tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8)
+                digest.update(raw.numpy().tobytes())
+        return digest.hexdigest()
+    if hasattr(component, "get_vocab"):
+        vocab = json.dumps(sorted(component.get_vocab().items()))
+        digest.update(vocab.encode("utf-8"))
+        digest.update(str(getattr(component, "model_max_length", "")).encode("utf-8"))
+        return digest.hexdigest()
+    return None
+
+
+class ModelPool:
+    """Loads diffusion pipelines by model id and keeps them under a memory budget.
+
+    Components with identical weights (tokenizer, text encoder, VAE, ...) are
+    stored once and shared between every pipeline that uses them. When the
+    unique weight bytes exceed the budget, least recently used pipelines are
+    dropped until it fits; the most recently requested model and pinned models
+    (held elsewhere for the life of the process) are always kept, and still
+    count against the budget.
+    """
+
+    def __init__(self, budget_bytes=None, device=None, dtype=None):
+        self.budget_bytes = budget_bytes if budget_bytes is not None else DEFAULT_BUDGET_MB * 1024 * 1024
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.dtype = dtype or (torch.float16 if self.device == "cuda" else torch.float32)
+        self.evictions = 0
+        self._models = OrderedDict()
+        self._pinned = set()
+        self._components = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def pin(self, model_id):
+        """Never evict `model_id`: dropping a pipeline someone still holds frees nothing."""
+        with self._lock:
+            self._pinned.add(model_id)
+
+    def lookup(self, model_id):
+        """The pipeline for `model_id` if it is loaded (marking it recently used), else None."""
+        with self._lock:
+            entry = self._models.get(model_id)
+            if entry is None:
+                return None
+            self._models.move_to_end(model_id)
+            return entry["pipe"]
+
+    def get(self, model_id, configure=None, **load_kwargs):
+        """Return the pipeline for `model_id`, loading it on first use.
+
+        `configure(pipe)` runs once after loading and before the move to the
+        device; it may return a replacement pipeline.
+        """
+        with self._lock:
+            if model_id in self._models:
+                self._models.move_to_end(model_id)
+                return self._models[model_id]["pipe"]
+            load_lock = self._load_locks.setdefault(model_id, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if model_id in self._models:
+                    self._models.move_to_end(model_id)
+                    return self._models[model_id]["pipe"]
+
+            load_kwargs.setdefault("torch_dtype", self.dtype)
+            pipe = StableDiffusionPipeline.from_pretrained(model_id, **load_kwargs)
+            hashes = self._share_components(model_id, pipe)
+            try:
+                if configure is not None:
+                    pipe = configure(pipe) or pipe
+                pipe = pipe.to(self.device)
+                if low_memory.ENABLED and self.device == "cpu":
+                    # After configure, so layouts it converts stay private copies
+                    low_memory.map_weights(pipe, model_id, load_kwargs.get("variant"))
+            except Exception:
+                with self._lock:
+                    self._unshare(model_id, hashes)
+                raise
+
+            with self._lock:
+                self._models[model_id] = {"pipe": pipe, "hashes": hashes}
+                self._evict(keep=model_id)
+            return pipe
+
+    def _share_components(self, model_id, pipe):
+        hashes = {}
+        for name, component in pipe.components.items():
+            if component is None or name in UNSHARED_COMPONENTS:
+                continue
+            digest = component_hash(component)
+            if digest is None:
+                continue
+            with self._lock:
+                shared = self._components.get(digest)
+                if shared is None:
+                    self._components[digest] = {
+                        "component": component,
+                        "bytes": component_bytes(component),
+                        "models": {model_id},
+                    }
+                else:
+                    shared["models"].add(model_id)
+            if shared is not None:
+                setattr(pipe, name, shared["component"])
+                print(f"♻️ {model_id}: sharing {name} with {', '.join(sorted(shared['models'] - {model_id}))}")
+            hashes[name] = digest
+        return hashes
+
+    def shared_names(self, pipe):
+        """Names of `pipe`'s components that other loaded models use too; changing one in place changes them all."""
+        with self._lock:
+            return sorted(
+                name for name, component in pipe.components.items()
+                if any(c["component"] is component and len(c["models"]) > 1 for c in self._components.values())
+            )
+
+    def used_bytes(self):
+        return sum(c["bytes"] for c in self._components.values())
+
+    def _evict(self, keep):
+        evicted = False
+        while self.used_bytes() > self.budget_bytes:
+            victim = next((m for m in self._models if m != keep and m not in self._pinned), None)
+            if victim is None:
+                break
+            self._drop(victim)
+            self.evictions += 1
+            evicted = True
+            print(f"🧹 Evicted {victim} to stay under the model memory budget")
+        if evicted:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def _drop(self, model_id):
+        entry = self._models.pop(model_id)
+        self._unshare(model_id, entry["hashes"])
+
+    def _unshare(self, model_id, hashes):
+        for digest in hashes.values():
+            shared = self._components.get(digest)
+            if shared is None:
+                continue
+            shared["models"].discard(model_id)
+            if not shared["models"]:
+                del self._components[digest]
+
+    def release(self, model_id):
+        with self._lock:
+            if model_id in self._models:
+                self._drop(model_id)
+        gc.collect()
+
+    def stats(self):
+        with self._lock:
+            used = self.used_bytes()
+            saved = sum(c["bytes"] * (len(c["models"]) - 1) for c in self._components.values())
+            return {
+                "models": list(self._models),
+                "pinned": sorted(self._pinned),
+                "used_bytes": used,
+                "shared_savings_bytes": saved,
+                "budget_bytes": self.budget_bytes,
+                "evictions": self.evictions,
+            }
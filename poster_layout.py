@@ -0,0 +1,102 @@
+"""Poster text and logo layout, importable without building the Gradio app.
+
+Batch and mail-merge worker processes only need this module (plus Pillow),
+not torch, diffusers or the app's model, caches and job queue.
+"""
+from PIL import ImageFont
+
+import fonts
+import logos
+import text_render
+from compositor import PosterCompositor
+
+LOGO_MAX_SIZE = 200
+TINT_ALPHA = 80
+
+
+def get_font(size):
+    try:
+        return fonts.registry.get(size, fonts.DEFAULT_FAMILIES)
+    except Exception as e:
+        print(f"Font loading error: {e}")
+        return ImageFont.load_default()
+
+
+def process_logo(logo_image, max_size=LOGO_MAX_SIZE):
+    if logo_image is None:
+        return None
+    try:
+        # Repeat brands are a cache lookup: keyed by content hash and size
+        return logos.prepared_logo(logo_image, max_size)
+    except Exception as e:
+        print(f"Logo processing error: {e}")
+        return None
+
+
+def text_layer(text, x, y, font, fill_color, outline_color, center=False, stroke_width=2):
+    sprite = text_render.outlined_text(text, font, fill_color, outline_color, stroke_width=stroke_width)
+    if center:
+        x = x - sprite.text_width // 2
+    return sprite.image, (x + sprite.offset[0], y + sprite.offset[1])
+
+
+def layout_layers(width, height, subtitle, details, logo=None, scale=1.0):
+    """Logo and text layers for a poster of this size, [(RGBA image, (x, y))] bottom to top.
+
+    `scale` multiplies the fixed spacing, margins and outline width, so a
+    print-size poster keeps the proportions of the screen layout.
+    """
+    base_size = min(width, height) // 15
+    subtitle_size = int(base_size * 0.8)
+    details_size = int(base_size * 0.5)
+
+    subtitle_font = get_font(subtitle_size)
+    details_font = get_font(details_size)
+    stroke_width = max(2, round(2 * scale))
+
+    y_pos = height // 3
+    spacing = int(60 * scale)
+    layers = []
+
+    # Logo goes down first so the text stays on top of it
+    if logo:
+        margin = int(50 * scale)
+        layers.append((logo, (width - logo.size[0] - margin, margin)))
+
+    if subtitle:
+        layers.append(text_layer(subtitle, width//2, y_pos, subtitle_font, 'white', 'black', True, stroke_width))
+        y_pos += spacing * 2
+
+    if details:
+        for line in details.split('\n'):
+            if line.strip():
+                layers.append(text_layer(line.strip(), width//2, y_pos, details_font, 'lightgray', 'black', True, stroke_width))
+                y_pos += spacing // 2
+
+    return layers
+
+
+def apply_text_layout(image, subtitle, details, logo=None):
+    poster = PosterCompositor(image, tint_alpha=TINT_ALPHA)
+    width, height = poster.size
+    for layer, position in layout_layers(width, height, subtitle, details, logo):
+        poster.paste(layer, position)
+    return poster.result()
+
+
+def create_base_layer(background, logo=None):
+    """Everything apply_text_layout draws that no text variant changes: darkened background plus logo."""
+    base = PosterCompositor(background, tint_alpha=TINT_ALPHA)
+    width, height = base.size
+    for layer, position in layout_layers(width, height, None, None, logo):
+        base.paste(layer, position)
+    return base.result()
+
+
+def stamp_text(base, subtitle, details):
+    """One text variant on a base layer; the base itself is left untouched."""
+    poster = PosterCompositor(base, tint_alpha=0)
+    width, height = poster.size
+    for layer, position in layout_layers(width, height, subtitle, details):
+        poster.paste(layer, position)
+    return poster.result()
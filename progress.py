@@ -0,0 +1,36 @@
+import time
+
+
+class ProgressReporter:
+    """Forwards real completion fractions to a UI sink.
+
+    `sink(fraction, message)` is only called when the fraction has moved by at
+    least `min_delta` or `min_interval` seconds have passed, so very fine
+    grained work (diffusion steps, filter passes) cannot flood the UI.
+    """
+
+    def __init__(self, sink, min_delta=0.01, min_interval=0.1):
+        self.sink = sink
+        self.min_delta = min_delta
+        self.min_interval = min_interval
+        self.fraction = 0.0
+        self.message = ""
+        self._last_sent = -1.0
+        self._last_time = 0.0
+
+    def __call__(self, fraction, message=None):
+        self.fraction = max(0.0, min(1.0, fraction))
+        if message is not None:
+            self.message = message
+        now = time.monotonic()
+        if (self.fraction >= 1.0
+                or self.fraction - self._last_sent >= self.min_delta
+                or now - self._last_time >= self.min_interval):
+            self._last_sent = self.fraction
+            self._last_time = now
+            self.sink(self.fraction, self.message)
+
+
+def streamlit_bar(bar):
+    """Sink for a `st.progress` element."""
+    return lambda fraction, message: bar.progress(fraction, text=message)
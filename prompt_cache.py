@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+import torch
+
+
+class PromptEmbeddingCache:
+    """LRU of text-encoder outputs keyed by model and token ids.
+
+    Keys use the tokenizer output rather than the raw string, so prompts that
+    only differ past the 77-token limit share an entry. Pinned entries (the
+    fixed negative prompt) are never evicted.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Hits since the last miss; a long streak means the text encoder is idle
+        self.streak = 0
+        self._entries = OrderedDict()
+        self._pinned = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def model_key(pipe):
+        return pipe.config.get("_name_or_path", "") if hasattr(pipe, "config") else ""
+
+    def _key(self, pipe, prompt, model_key):
+        tokenizer = pipe.tokenizer
+        ids = tokenizer(
+            prompt,
+            padding="max_length",
+            max_length=tokenizer.model_max_length,
+            truncation=True,
+        ).input_ids
+        return (model_key or self.model_key(pipe), tuple(ids))
+
+    def encode(self, pipe, prompt, model_key=None, pin=False):
+        """Return `prompt_embeds` (1 x tokens x dim) for one prompt on the pipeline's device."""
+        key = self._key(pipe, prompt, model_key)
+        with self._lock:
+            embeds = self._pinned.get(key)
+            if embeds is None:
+                embeds = self._entries.get(key)
+                if embeds is not None:
+                    self._entries.move_to_end(key)
+            if embeds is not None:
+                self.hits += 1
+                self.streak += 1
+                return embeds
+            self.misses += 1
+            self.streak = 0
+
+        with torch.inference_mode():
+            embeds, _ = pipe.encode_prompt(prompt, pipe.device, 1, False)
+
+        with self._lock:
+            if pin:
+                self._pinned[key] = embeds
+            else:
+                self._entries[key] = embeds
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return embeds
+
+    def encode_batch(self, pipe, prompts, model_key=None):
+        return torch.cat([self.encode(pipe, p, model_key) for p in prompts], dim=0)
+
+    def warm(self, min_hits):
+        """True once the last `min_hits` lookups were all answered from the cache."""
+        with self._lock:
+            return self.streak >= min_hits
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "pinned": len(self._pinned),
+                "streak": self.streak,
+            }
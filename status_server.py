@@ -0,0 +1,56 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = int(os.getenv("POSTER_STATUS_PORT", "7861"))
+
+# path -> callable returning (status_code, content_type, body)
+_routes = {}
+_server = None
+
+
+def route(path):
+    def register(fn):
+        _routes[path] = fn
+        return fn
+    return register
+
+
+def json_response(payload, status=200):
+    return status, "application/json", json.dumps(payload)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        handler = _routes.get(self.path.split("?", 1)[0])
+        if handler is None:
+            status, content_type, body = json_response({"error": "not found"}, 404)
+        else:
+            try:
+                status, content_type, body = handler()
+            except Exception as e:
+                status, content_type, body = json_response({"error": str(e)}, 500)
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start(host="0.0.0.0", port=DEFAULT_PORT):
+    """Serve the registered routes from a daemon thread; safe to call more than once."""
+    global _server
+    if _server is None:
+        try:
+            _server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError as e:
+            print(f"⚠️ Status endpoints disabled, cannot bind port {port}: {e}")
+            return None
+        threading.Thread(target=_server.serve_forever, name="status-server", daemon=True).start()
+        print(f"🩺 Status endpoints on http://{host}:{port} ({', '.join(sorted(_routes))})")
+    return _server
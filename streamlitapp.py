@@ -1,13 +1,14 @@
 import streamlit as st
 import PIL.Image as Image
-import PIL.ImageFilter as ImageFilter
-import PIL.ImageEnhance as ImageEnhance
-import PIL.ImageOps as ImageOps
+import hashlib
 import io
 import base64
-import time
 import random
 
+import encoding
+import filters
+from progress import ProgressReporter, streamlit_bar
+
 # Configure page
 st.set_page_config(
     page_title="AI Poster Generator",
@@ -93,14 +94,6 @@ st.markdown("""
         margin-bottom: 1rem;
     }
     
-    .processing-animation {
-        text-align: center;
-        padding: 2rem;
-        background: linear-gradient(45deg, #ff9a9e 0%, #fecfef 50%, #fecfef 100%);
-        border-radius: 15px;
-        color: #333;
-    }
-    
     .stTextArea > div > div > textarea {
         border-radius: 10px;
         border: 2px solid #e0e0e0;
@@ -117,70 +110,48 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def apply_mock_transformation(image, prompt):
+def apply_mock_transformation(image, prompt, progress=None):
     """Apply mock transformations based on prompt keywords"""
-    img = image.copy()
-    prompt_lower = prompt.lower()
-    
-    # Apply different filters based on prompt content
-    if any(word in prompt_lower for word in ['blur', 'soft', 'dream']):
-        img = img.filter(ImageFilter.GaussianBlur(radius=2))
-    
-    elif any(word in prompt_lower for word in ['sharp', 'enhance', 'crisp']):
-        img = img.filter(ImageFilter.SHARPEN)
-    
-    elif any(word in prompt_lower for word in ['bright', 'light', 'sunny']):
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(1.3)
-    
-    elif any(word in prompt_lower for word in ['dark', 'moody', 'shadow']):
-        enhancer = ImageEnhance.Brightness(img)
-        img = enhancer.enhance(0.7)
-    
-    elif any(word in prompt_lower for word in ['colorful', 'vibrant', 'saturated']):
-        enhancer = ImageEnhance.Color(img)
-        img = enhancer.enhance(1.5)
-    
-    elif any(word in prompt_lower for word in ['vintage', 'old', 'sepia']):
-        img = ImageOps.colorize(ImageOps.grayscale(img), '#704214', '#C0A882')
-    
-    elif any(word in prompt_lower for word in ['black', 'white', 'mono']):
-        img = ImageOps.grayscale(img)
-    
-    elif any(word in prompt_lower for word in ['contrast', 'dramatic']):
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(1.5)
-    
-    else:
-        # Default enhancement
-        enhancer = ImageEnhance.Color(img)
-        img = enhancer.enhance(1.2)
-    
-    return img
+    # Every matched effect is applied; point operations share one fused LUT
+    return filters.transform(image, prompt, progress)
 
-def create_processing_animation():
-    """Create a processing animation"""
-    processing_container = st.empty()
-    
-    messages = [
-        "🔍 Analyzing your image...",
-        "🧠 Understanding your prompt...",
-        "✨ Applying AI magic...",
-        "🎨 Generating modifications...",
-        "🚀 Almost ready..."
-    ]
-    
-    for i, message in enumerate(messages):
-        processing_container.markdown(f"""
-        <div class="processing-animation">
-            <h3>{message}</h3>
-            <div style="width: {(i+1)*20}%; height: 4px; background: linear-gradient(90deg, #667eea 0%, #764ba2 100%); 
-                 border-radius: 2px; margin: 1rem auto;"></div>
-        </div>
-        """, unsafe_allow_html=True)
-        time.sleep(0.8)
-    
-    processing_container.empty()
+PREVIEW_MAX_SIZE = 1024
+
+def upload_digest(uploaded_file):
+    """Content hash of an upload, computed once per uploaded file"""
+    file_id = getattr(uploaded_file, "file_id", None) or uploaded_file.name
+    digests = st.session_state.setdefault("upload_digests", {})
+    if file_id not in digests:
+        digests[file_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return digests[file_id]
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def decode_upload(digest, _data):
+    """Decode an upload once; reruns get the same Image object back"""
+    image = Image.open(io.BytesIO(_data))
+    image.load()
+    return image
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def preview_proxy(digest, _image):
+    """Downscaled copy used for every on-screen preview"""
+    proxy = _image.copy()
+    proxy.thumbnail((PREVIEW_MAX_SIZE, PREVIEW_MAX_SIZE), Image.Resampling.LANCZOS)
+    return proxy
+
+@st.cache_resource(max_entries=32, show_spinner=False)
+def transformed_preview(digest, prompt, _proxy, _progress=None):
+    return apply_mock_transformation(_proxy, prompt, _progress)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def full_resolution_download(digest, prompt, fmt, _image, _progress=None):
+    """Full-size transform, encoded only when a download is requested"""
+    return encoding.encode(apply_mock_transformation(_image, prompt, _progress), fmt)
+
+def progress_bar(text):
+    """A progress bar driven by the real work, with no artificial delay"""
+    bar = st.progress(0.0, text=text)
+    return bar, ProgressReporter(streamlit_bar(bar))
 
 # Main app header
 st.markdown("""
@@ -208,10 +179,12 @@ with col1:
     )
     
     if uploaded_file is not None:
-        # Display uploaded image
-        image = Image.open(uploaded_file)
+        # Display uploaded image (decoded once, shown through the preview proxy)
+        digest = upload_digest(uploaded_file)
+        image = decode_upload(digest, uploaded_file.getvalue())
+        proxy = preview_proxy(digest, image)
         st.markdown('<div class="image-container">', unsafe_allow_html=True)
-        st.image(image, caption="Original Image", use_column_width=True)
+        st.image(proxy, caption=f"Original Image ({image.width}×{image.height})", use_column_width=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
 with col2:
@@ -252,17 +225,18 @@ if uploaded_file is not None and prompt:
     col3, col4, col5 = st.columns([1, 2, 1])
     with col4:
         if st.button("🚀 Transform Image", key="transform"):
-            # Create processing animation
-            create_processing_animation()
-            
-            # Apply transformation
-            image = Image.open(uploaded_file)
-            transformed_image = apply_mock_transformation(image, prompt)
+            # Apply transformation to the preview proxy; full resolution waits for download
+            bar, report = progress_bar("🔍 Analyzing your prompt...")
+            transformed_image = transformed_preview(digest, prompt, proxy, report)
+            bar.empty()
             
             # Store in session state
             st.session_state.transformed_image = transformed_image
-            st.session_state.original_image = image
+            st.session_state.original_image = proxy
+            st.session_state.full_image = image
+            st.session_state.used_digest = digest
             st.session_state.used_prompt = prompt
+            st.session_state.pop("download_bytes", None)
 
 # Display results
 if 'transformed_image' in st.session_state:
@@ -283,17 +257,32 @@ if 'transformed_image' in st.session_state:
         st.markdown("**✨ Transformed**")
         st.image(st.session_state.transformed_image, use_column_width=True)
     
-    # Download button
-    buf = io.BytesIO()
-    st.session_state.transformed_image.save(buf, format='PNG')
-    byte_data = buf.getvalue()
-    
-    st.download_button(
-        label="📥 Download Transformed Image",
-        data=byte_data,
-        file_name="ai_transformed_image.png",
-        mime="image/png"
+    # Download button: render and encode at full resolution on request only
+    full = st.session_state.full_image
+    download_format = st.selectbox(
+        "Download format",
+        list(encoding.FORMATS),
+        index=list(encoding.FORMATS).index(encoding.DEFAULT_FORMAT),
+        help="WebP and JPEG are much smaller; PNG is lossless"
     )
+    download = st.session_state.get("download_bytes")
+    if download is None or download.mime != encoding.FORMATS[download_format][1]:
+        if st.button(f"🖨️ Prepare full-resolution download ({full.width}×{full.height})", key="prepare_download"):
+            bar, report = progress_bar("🖨️ Rendering full resolution...")
+            download = st.session_state.download_bytes = full_resolution_download(
+                st.session_state.used_digest, st.session_state.used_prompt, download_format, full, report
+            )
+            bar.empty()
+        else:
+            download = None
+    
+    if download is not None:
+        st.download_button(
+            label="📥 Download Transformed Image",
+            data=download.data,
+            file_name=f"ai_transformed_image.{download.extension}",
+            mime=download.mime
+        )
     
     st.success(f"✅ Successfully applied: '{st.session_state.used_prompt}'")
 
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from PIL import Image
+
+import background_cache
+from background_cache import BackgroundCache
+
+
+def image(color, size=(32, 32)):
+    return Image.new("RGB", size, color)
+
+
+def test_key_is_stable_and_covers_every_input():
+    key = background_cache.cache_key(prompt="sunset", steps=20, size=(512, 768))
+    assert key == background_cache.cache_key(size=(512, 768), steps=20, prompt="sunset")
+    assert key != background_cache.cache_key(prompt="sunset", steps=21, size=(512, 768))
+    assert len(key) == 64
+
+
+def test_round_trip_and_restart(tmp_path):
+    cache = BackgroundCache(str(tmp_path), max_bytes=10 ** 6)
+    cache.put("a", image("red"))
+    assert cache.get("a").getpixel((0, 0)) == (255, 0, 0)
+    assert cache.get("b") is None
+    assert BackgroundCache(str(tmp_path)).get("a") is not None
+
+
+def test_least_recently_used_is_evicted_first(tmp_path):
+    cache = BackgroundCache(str(tmp_path), max_bytes=10 ** 6)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, image((i * 80, 0, 0)))
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+        cache._entries[key][1] = 1000 + i
+    cache.get("a")  # a is now the most recent
+    cache.max_bytes = cache.stats()["bytes"] + 16  # room for three small solid PNGs
+    cache.put("d", image("blue"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert not os.path.exists(cache._path("b"))
+    assert cache.stats()["evictions"] == 1
+
+
+def test_writes_are_atomic(tmp_path, monkeypatch):
+    cache = BackgroundCache(str(tmp_path), max_bytes=10 ** 6)
+
+    def broken_save(self, fp, format=None, **params):
+        fp.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(Image.Image, "save", broken_save)
+    with pytest.raises(OSError):
+        cache.put("a", image("red"))
+    assert os.listdir(tmp_path) == []
+    assert cache.get("a") is None
+
+
+def test_stale_temp_files_are_removed_on_start(tmp_path):
+    (tmp_path / "abc.tmp").write_bytes(b"partial")
+    BackgroundCache(str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+
+def test_file_evicted_by_another_worker_is_a_miss(tmp_path, monkeypatch):
+    cache = BackgroundCache(str(tmp_path), max_bytes=10 ** 6)
+    cache.put("a", image("red"))
+
+    def gone(path):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(background_cache.os.path, "getmtime", gone)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1 and cache.stats()["entries"] == 0
@@ -0,0 +1,80 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import encoding
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    encoding.clear_cache()
+    yield
+    encoding.clear_cache()
+
+
+def age(path, seconds):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_prune_keeps_newest_tmp_and_recent_files(tmp_path):
+    for i in range(5):
+        path = tmp_path / f"old{i}.webp"
+        path.write_bytes(b"x")
+        age(path, 100 + i)
+    writing = tmp_path / "poster-web.webp.1.2.tmp"
+    writing.write_bytes(b"x")
+    age(writing, 500)
+    since = time.time() - 1
+    fresh = tmp_path / "fresh.webp"
+    fresh.write_bytes(b"x")
+
+    encoding.prune_directory(str(tmp_path), keep=1, since=since)
+    assert sorted(os.listdir(tmp_path)) == ["fresh.webp", "poster-web.webp.1.2.tmp"]
+
+
+def test_prune_keeps_files_protected_by_since(tmp_path):
+    for i in range(3):
+        (tmp_path / f"new{i}.webp").write_bytes(b"x")
+    encoding.prune_directory(str(tmp_path), keep=1, since=time.time() - 60)
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_reused_files_are_refreshed(tmp_path):
+    image = Image.new("RGB", (32, 32), "red")
+    encoded = {"web": encoding.encode(image, "png")}
+    path = encoding.write_files(encoded, str(tmp_path), "poster")["web"]
+    age(path, 1000)
+    since = time.time()
+    assert encoding.write_files(encoded, str(tmp_path), "poster")["web"] == path
+    assert os.path.getmtime(path) >= since - 1
+
+
+def test_formats_and_cache_hits():
+    image = Image.new("RGB", (300, 200), "navy")
+    for fmt, (pil_format, mime, extension) in encoding.FORMATS.items():
+        encoded = encoding.encode(image, fmt, key="poster")
+        assert (encoded.mime, encoded.extension, encoded.size) == (mime, extension, (300, 200))
+        with Image.open(io.BytesIO(encoded.data)) as decoded:
+            assert decoded.format == pil_format
+    assert encoding.encode(image, "png", key="poster") is encoding.encode(image, "png", key="poster")
+    assert encoding.cache_info()["hits"] == 2
+    with pytest.raises(ValueError):
+        encoding.encode(image, "gif")
+
+
+def test_jpeg_flattens_alpha_onto_white():
+    image = Image.new("RGBA", (8, 8), (0, 0, 0, 0))
+    data = encoding.encode(image, "jpeg").data
+    with Image.open(io.BytesIO(data)) as decoded:
+        assert min(decoded.convert("L").getextrema()) > 240
+
+
+def test_derivatives_are_resized():
+    image = Image.new("RGB", (2000, 1000), "green")
+    out = encoding.derivatives(image, names=["thumbnail", "web"])
+    assert out["thumbnail"].size == (256, 128)
+    assert out["web"].size == (1024, 512)
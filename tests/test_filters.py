@@ -0,0 +1,44 @@
+import numpy as np
+from PIL import Image, ImageEnhance
+
+import filters
+
+
+def sample_image(mode="RGB"):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (32, 48, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels, "RGB")
+    if mode == "RGBA":
+        image.putalpha(Image.linear_gradient("L").resize(image.size))
+    return image
+
+
+def test_parse_effects_uses_application_order():
+    assert filters.parse_effects("A dreamy, BRIGHT vintage poster") == ["vintage", "bright", "blur"]
+    assert filters.parse_effects("city skyline") == ["default"]
+    # Longest match wins: "colorful" is not read as something shorter
+    assert filters.parse_effects("colorful") == ["colorful"]
+
+
+def test_brightness_matches_image_enhance():
+    image = sample_image()
+    expected = np.asarray(ImageEnhance.Brightness(image).enhance(filters.BRIGHTNESS["bright"]), dtype=int)
+    result = np.asarray(filters.apply_effects(image, ["bright"]), dtype=int)
+    assert np.abs(result - expected).max() <= 1
+
+
+def test_mono_is_grey():
+    result = filters.transform(sample_image(), "black and white")
+    assert result.mode == "L"
+    expected = np.asarray(sample_image().convert("L"))
+    assert (np.asarray(result) == expected).all()
+
+
+def test_alpha_is_preserved_and_progress_finishes():
+    image = sample_image("RGBA")
+    reports = []
+    result = filters.transform(image, "moody sharp", progress=lambda f, m: reports.append(f))
+    assert result.mode == "RGBA"
+    assert (np.asarray(result.getchannel("A")) == np.asarray(image.getchannel("A"))).all()
+    assert reports and reports[-1] == 1.0
+    assert reports == sorted(reports)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import gradients
+
+
+@pytest.fixture(autouse=True)
+def clean_cache(monkeypatch):
+    gradients.clear_cache()
+    yield
+    gradients.clear_cache()
+
+
+def test_vertical_gradient_runs_between_stops():
+    image = gradients.linear_gradient(4, 10, [(0, 0, 0), (200, 100, 50)])
+    pixels = np.asarray(image)
+    assert image.size == (4, 10)
+    assert tuple(pixels[0, 0]) == (0, 0, 0)
+    assert pixels[-1, 0, 0] > pixels[0, 0, 0]
+    # Columns are identical for a top-to-bottom gradient
+    assert (pixels == pixels[:, :1]).all()
+
+
+def test_radial_gradient_starts_at_center():
+    pixels = np.asarray(gradients.radial_gradient(21, 21, [(255, 255, 255), (0, 0, 0)]))
+    assert pixels[10, 10, 0] == pixels[..., 0].max() > 240
+    assert tuple(pixels[0, 0]) == (0, 0, 0)
+
+
+def test_normalize_stops_accepts_positions():
+    assert gradients.normalize_stops([(1.0, (1, 2, 3)), (0.0, (4, 5, 6))]) == ((0.0, (4, 5, 6)), (1.0, (1, 2, 3)))
+    with pytest.raises(ValueError):
+        gradients.normalize_stops([(0, 0, 0)])
+
+
+def test_cache_hit_returns_a_copy():
+    first = gradients.linear_gradient(8, 8, [(0, 0, 0), (255, 255, 255)])
+    first.paste((1, 2, 3), (0, 0, 8, 8))
+    second = gradients.linear_gradient(8, 8, [(0, 0, 0), (255, 255, 255)])
+    assert second.getpixel((0, 0)) == (0, 0, 0)
+    assert gradients.cache_info()["hits"] == 1
+
+
+def test_eviction_keeps_byte_count_in_budget(monkeypatch):
+    monkeypatch.setattr(gradients, "CACHE_MAX_BYTES", 2 * 16 * 16 * 3)
+    for shade in range(5):
+        gradients.linear_gradient(16, 16, [(0, 0, 0), (shade, shade, shade)])
+    info = gradients.cache_info()
+    assert info["entries"] == 2
+    assert info["bytes"] == 2 * 16 * 16 * 3
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import pytest
+
+import jobs
+from jobs import JobManager, JobQueueFull
+
+
+def blocker():
+    release = threading.Event()
+
+    def fn(job):
+        release.wait(5)
+        return "done"
+
+    return release, fn
+
+
+def report_until_stopped(job):
+    for step in range(500):
+        job.report(step, 500)
+        time.sleep(0.01)
+    return "finished"
+
+
+def test_cancelled_queued_job_never_runs():
+    manager = JobManager(max_workers=1, max_queue=4)
+    release, fn = blocker()
+    first = manager.submit(fn)
+    ran = []
+    second = manager.submit(lambda job: ran.append(job))
+    manager.cancel(second.id)
+    release.set()
+    assert first.wait(5) and second.wait(5)
+    assert first.status == jobs.DONE
+    assert second.status == jobs.CANCELLED
+    assert ran == []
+
+
+def test_cancelling_a_running_job_stops_it_at_the_next_report():
+    manager = JobManager(max_workers=1)
+    job = manager.submit(report_until_stopped)
+    while job.status != jobs.RUNNING:
+        time.sleep(0.005)
+    manager.cancel(job.id)
+    assert job.wait(5)
+    assert job.status == jobs.CANCELLED
+    assert job.result is None
+    assert manager.queue_depth() == 0
+
+
+def test_submissions_beyond_the_queue_limit_are_rejected():
+    manager = JobManager(max_workers=1, max_queue=2)
+    release, fn = blocker()
+    accepted = [manager.submit(fn), manager.submit(fn)]
+    with pytest.raises(JobQueueFull):
+        manager.submit(fn)
+    release.set()
+    for job in accepted:
+        assert job.wait(5)
+    # Room again once the outstanding jobs have finished
+    assert manager.submit(lambda job: 1).wait(5)
+
+
+def test_job_nobody_polls_is_abandoned():
+    manager = JobManager(max_workers=1, abandon_after=0.05)
+    job = manager.submit(report_until_stopped)
+    assert job.wait(5)
+    assert job.status == jobs.CANCELLED
+
+
+def test_polled_job_is_not_abandoned():
+    manager = JobManager(max_workers=1, abandon_after=0.05)
+
+    def short(job):
+        for step in range(20):
+            job.report(step, 20)
+            time.sleep(0.01)
+        return "ok"
+
+    job = manager.submit(short)
+    while not job.wait(0.01):
+        job.touch()
+    assert job.status == jobs.DONE and job.result == "ok"
+
+
+def test_finished_jobs_are_pruned_past_the_limit():
+    manager = JobManager(max_workers=1, keep_finished=2)
+    finished = [manager.submit(lambda job: 1) for _ in range(4)]
+    for job in finished:
+        job.wait(5)
+    latest = manager.submit(lambda job: 1)
+    assert [manager.get(job.id) for job in finished[:2]] == [None, None]
+    assert manager.get(latest.id) is latest
+
+
+def test_phase_scales_progress_so_it_never_goes_backwards():
+    job = jobs.Job()
+    job.phase(0.0, 0.95)
+    job.report(10, 10)
+    assert job.progress == pytest.approx(0.95)
+    job.phase(0.0, 1.0)
+    job.report(0.95)
+    assert job.progress == pytest.approx(0.95)
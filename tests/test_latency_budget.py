@@ -0,0 +1,70 @@
+import pytest
+
+import latency_budget
+from latency_budget import StepTimeEstimator
+
+
+def test_scaled_size_rounds_to_multiples_of_eight():
+    assert latency_budget.scaled_size(683, 1024, 1.0) == (680, 1024)
+    assert latency_budget.scaled_size(1024, 576, 0.75) == (768, 432)
+    assert latency_budget.scaled_size(40, 40, 0.5) == (64, 64)
+
+
+def test_estimator_blends_and_scales_by_pixels():
+    estimator = StepTimeEstimator()
+    estimator.observe("m", 512, 512, 1.0, 2.0)
+    estimator.observe("m", 512, 512, 2.0, 2.0)
+    assert estimator.step_seconds("m", 512, 512) == pytest.approx(1.3)
+    # Unmeasured size: scaled from the nearest measured one by pixel count
+    assert estimator.step_seconds("m", 1024, 512) == pytest.approx(2.6)
+    assert estimator.estimate("m", 512, 512, 10) == pytest.approx(2.0 + 13.0)
+
+
+def test_prior_is_used_before_any_measurement():
+    estimator = StepTimeEstimator()
+    assert not latency_budget.measured(estimator)
+    assert estimator.step_seconds("m", 500, 500) == pytest.approx(latency_budget.PRIOR_STEP_SECONDS_PER_MP * 0.25)
+
+
+def test_presets_fix_steps_and_scale():
+    plan = latency_budget.plan("draft", "m", 1024, 1024, estimator=StepTimeEstimator())
+    assert (plan.steps, plan.width, plan.height) == (12, 768, 768)
+    plan = latency_budget.plan("unknown", "m", 1024, 1024, estimator=StepTimeEstimator())
+    assert plan.steps == latency_budget.PRESETS["final"][0]
+
+
+def test_deadline_keeps_resolution_while_steps_are_good():
+    estimator = StepTimeEstimator()
+    estimator.observe("m", 1024, 1024, 1.0, 0.0)
+    plan = latency_budget.plan(latency_budget.DEADLINE, "m", 1024, 1024, deadline=30, estimator=estimator)
+    assert (plan.width, plan.height) == (1024, 1024)
+    assert plan.steps == 30
+
+
+def test_deadline_drops_resolution_before_steps():
+    estimator = StepTimeEstimator()
+    estimator.observe("m", 1024, 1024, 1.0, 0.0)
+    plan = latency_budget.plan(latency_budget.DEADLINE, "m", 1024, 1024, deadline=12, estimator=estimator)
+    assert plan.width < 1024
+    assert plan.steps >= latency_budget.GOOD_STEPS or plan.width == 512
+    assert plan.estimated_seconds <= 12
+
+
+def test_deadline_counts_time_already_spent():
+    estimator = StepTimeEstimator()
+    estimator.observe("m", 512, 512, 1.0, 0.0)
+    fresh = latency_budget.plan(latency_budget.DEADLINE, "m", 512, 512, deadline=100, estimator=estimator)
+    late = latency_budget.plan(latency_budget.DEADLINE, "m", 512, 512, deadline=100, elapsed=90, estimator=estimator)
+    assert (fresh.width, fresh.steps) == (512, latency_budget.MAX_STEPS)
+    assert late.width < 512
+    assert late.estimated_seconds <= 10
+
+
+def test_batched_timings_do_not_inflate_single_render_estimates():
+    estimator = StepTimeEstimator()
+    estimator.observe("m", 512, 512, 1.0, 2.0)
+    estimator.observe("m", 512, 512, 3.2, 2.5, batch_size=4)
+    assert estimator.step_seconds("m", 512, 512) == pytest.approx(1.0)
+    assert estimator.step_seconds("m", 512, 512, batch_size=4) == pytest.approx(3.2)
+    # An unmeasured batch size scales from the nearest in pixels times batch
+    assert estimator.step_seconds("m", 512, 512, batch_size=2) == pytest.approx(2.0)
@@ -0,0 +1,57 @@
+import numpy as np
+from PIL import Image, ImageDraw
+
+import logos
+import poster_layout
+
+
+def transparent_logo():
+    logo = Image.new("RGBA", (600, 400), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(logo)
+    draw.ellipse((100, 50, 500, 350), fill=(220, 40, 40, 255))
+    draw.rectangle((250, 150, 350, 250), fill=(40, 40, 220, 128))
+    return logo
+
+
+def straight_thumbnail(image, max_size):
+    # What process_logo did before logos were premultiplied and cached
+    logo = image.copy()
+    logo.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return logo.convert("RGBA")
+
+
+def test_premultiplied_logo_matches_a_straight_resize():
+    source = transparent_logo()
+    logo = np.asarray(poster_layout.process_logo(source, 200), dtype=np.int16)
+    expected = np.asarray(straight_thumbnail(source, 200), dtype=np.int16)
+    assert logo.shape == expected.shape
+    assert np.abs(logo[..., 3] - expected[..., 3]).max() <= 1
+    # Colour only matters where the logo is visible enough to see it
+    visible = expected[..., 3] > 32
+    assert np.abs(logo[..., :3] - expected[..., :3])[visible].max() <= 8
+
+
+def test_opaque_logo_becomes_rgb():
+    logo = poster_layout.process_logo(Image.new("RGB", (400, 400), "navy"), 100)
+    assert logo.mode == "RGB" and logo.size == (100, 100)
+
+
+def test_repeat_upload_is_served_from_the_cache_unchanged():
+    source = transparent_logo()
+    first = logos.prepared_logo(source, 150)
+    pixels = first.tobytes()
+    hits = logos.cache_info()["hits"]
+    # A re-upload of the same brand is a different object with the same content
+    again = logos.prepared_logo(transparent_logo(), 150)
+    assert again is first
+    assert again.tobytes() == pixels
+    assert logos.cache_info()["hits"] == hits + 1
+
+
+def test_pasting_the_logo_leaves_the_cached_image_alone():
+    source = transparent_logo()
+    logo = poster_layout.process_logo(source, 120)
+    pixels = logo.tobytes()
+    background = Image.new("RGB", (400, 300), (100, 150, 255))
+    poster_layout.apply_text_layout(background, "Title", "Details", logo)
+    assert poster_layout.process_logo(source, 120).tobytes() == pixels
@@ -0,0 +1,91 @@
+import json
+import struct
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import low_memory
+
+
+def write_safetensors(path, tensors):
+    header = {}
+    blobs = []
+    offset = 0
+    for name, tensor in tensors.items():
+        data = tensor.contiguous().numpy().tobytes()
+        header[name] = {"dtype": "F32", "shape": list(tensor.shape), "data_offsets": [offset, offset + len(data)]}
+        blobs.append(data)
+        offset += len(data)
+    raw = json.dumps(header).encode("utf-8")
+    raw += b" " * (-len(raw) % 8)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(raw)))
+        f.write(raw)
+        for data in blobs:
+            f.write(data)
+
+
+class Pipe:
+    def __init__(self):
+        torch.manual_seed(0)
+        self.unet = torch.nn.Linear(4, 3)
+        self.vae = None
+        self.text_encoder = None
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    pipe = Pipe()
+    unet = tmp_path / "unet"
+    unet.mkdir()
+    loaded = {name: p.detach().clone() for name, p in pipe.unet.named_parameters()}
+    write_safetensors(unet / "diffusion_pytorch_model.safetensors", loaded)
+    # Same names and shapes, different numbers: must never be mapped
+    other = {name: t + 1 for name, t in loaded.items()}
+    write_safetensors(unet / "diffusion_pytorch_model.non_ema.safetensors", other)
+    write_safetensors(unet / "diffusion_pytorch_model.fp16.safetensors", other)
+    return tmp_path, pipe, loaded
+
+
+def test_weight_files_picks_the_loaded_file(checkpoint):
+    root, _, _ = checkpoint
+    unet = root / "unet"
+    assert low_memory.weight_files(str(unet)) == [str(unet / "diffusion_pytorch_model.safetensors")]
+    assert low_memory.weight_files(str(unet), "fp16") == [str(unet / "diffusion_pytorch_model.fp16.safetensors")]
+    assert low_memory.weight_files(str(root / "vae")) == []
+
+
+def test_mapped_tensors_equal_loaded_ones(checkpoint):
+    root, pipe, loaded = checkpoint
+    assert low_memory.map_weights(pipe, str(root)) == sum(t.numel() * 4 for t in loaded.values())
+    for name, param in pipe.unet.named_parameters():
+        assert torch.equal(param, loaded[name])
+    assert low_memory.release(pipe.unet, "unet") >= 0
+    # Released pages come back from the file unchanged
+    for name, param in pipe.unet.named_parameters():
+        assert torch.equal(param, loaded[name])
+
+
+def test_different_values_are_not_mapped(checkpoint):
+    root, pipe, loaded = checkpoint
+    with torch.no_grad():
+        pipe.unet.weight.add_(1)
+    expected = pipe.unet.weight.detach().clone()
+    low_memory.map_weights(pipe, str(root))
+    assert torch.equal(pipe.unet.weight, expected)
+    assert torch.equal(pipe.unet.bias, loaded["bias"])
+
+
+def test_mapping_leaves_unused_weights_out_of_rss(tmp_path):
+    if "RssFile" not in low_memory.memory_usage():
+        pytest.skip("needs /proc/self/status")
+    pipe = Pipe()
+    pipe.unet = torch.nn.Linear(2048, 2048, bias=False)
+    unet = tmp_path / "unet"
+    unet.mkdir()
+    write_safetensors(unet / "diffusion_pytorch_model.safetensors", {"weight": pipe.unet.weight.detach()})
+    before = low_memory.memory_usage()["RssFile"]
+    assert low_memory.map_weights(pipe, str(tmp_path)) == 2048 * 2048 * 4
+    # 16 MB mapped and verified, but not left resident
+    assert low_memory.memory_usage()["RssFile"] - before < 4 * 2**20
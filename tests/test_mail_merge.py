@@ -0,0 +1,63 @@
+import csv
+import json
+import os
+
+from PIL import Image
+
+import mail_merge
+from batch_render import CHECKPOINT_NAME, FAILURES_NAME
+
+
+def write_variants(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["id", "subtitle", "details"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def fake_base(monkeypatch):
+    # Stands in for the diffusion render, which needs the whole app
+    def render_base(template, out_dir):
+        path = os.path.join(out_dir, mail_merge.BASE_NAME)
+        Image.new("RGB", (160, 120), (40, 60, 120)).save(path)
+        return path
+
+    monkeypatch.setattr(mail_merge, "render_base", render_base)
+
+
+def run(variants, out_dir):
+    return mail_merge.run({}, variants, str(out_dir), workers=1, fmt="png", chunk_size=2, max_inflight=2)
+
+
+def checkpoint(out_dir):
+    return (out_dir / CHECKPOINT_NAME).read_text().split()
+
+
+def test_resume_skips_variants_already_in_the_checkpoint(tmp_path, monkeypatch):
+    fake_base(monkeypatch)
+    out_dir = tmp_path / "out"
+    rows = [{"id": "a", "subtitle": "One"}, {"id": "b", "subtitle": "Two"}]
+    assert run(write_variants(tmp_path / "part.csv", rows), out_dir)
+    assert sorted(checkpoint(out_dir)) == ["a", "b"]
+
+    # Re-run with the full list: only the new rows are stamped
+    os.remove(out_dir / "a.png")
+    rows.append({"id": "c", "subtitle": "Three", "details": "Line one\nLine two"})
+    assert run(write_variants(tmp_path / "all.csv", rows), out_dir)
+    assert sorted(checkpoint(out_dir)) == ["a", "b", "c"]
+    assert not (out_dir / "a.png").exists()
+    with Image.open(out_dir / "c.png") as poster:
+        assert poster.size == (160, 120)
+
+
+def test_bad_row_is_recorded_and_the_rest_still_stamped(tmp_path, monkeypatch):
+    fake_base(monkeypatch)
+    out_dir = tmp_path / "out"
+    rows = [{"id": "good", "subtitle": "Fine"}, {"id": "no/such/dir", "subtitle": "Broken"},
+            {"id": "also-good", "subtitle": "Fine too"}]
+    assert not run(write_variants(tmp_path / "variants.csv", rows), out_dir)
+    assert sorted(checkpoint(out_dir)) == ["also-good", "good"]
+    (failure,) = [json.loads(line) for line in (out_dir / FAILURES_NAME).read_text().splitlines()]
+    assert failure["id"] == "no/such/dir" and failure["error"]
+    assert not [name for name in os.listdir(out_dir) if name.endswith(".tmp")]
@@ -0,0 +1,67 @@
+import json
+import os
+
+from model_index import ModelIndex
+
+PATTERNS = ("*diffusion*",)
+INDICATORS = ("model_index.json", "unet")
+
+
+def make_model(tmp_path, name, indicators=INDICATORS):
+    # Scanned tree kept apart from the index file, whose writes touch tmp_path
+    path = tmp_path / "tree" / "models" / name
+    path.mkdir(parents=True)
+    for indicator in indicators:
+        (path / indicator).mkdir()
+    return str(path)
+
+
+def bump_mtime(path):
+    mtime = os.stat(path).st_mtime + 10
+    os.utime(path, (mtime, mtime))
+
+
+def test_unchanged_tree_is_served_from_the_index(tmp_path):
+    model = make_model(tmp_path, "stable-diffusion-a")
+    index = ModelIndex(str(tmp_path / "index.json"))
+    models, cached = index.lookup(str(tmp_path / "tree"), PATTERNS, INDICATORS)
+    assert not cached
+    assert models == [{"path": model, "indicators": list(INDICATORS)}]
+    assert index.lookup(str(tmp_path / "tree"), PATTERNS, INDICATORS) == (models, True)
+
+
+def test_directory_mtime_change_invalidates_and_rescan_rewrites_index(tmp_path):
+    first = make_model(tmp_path, "stable-diffusion-a")
+    index_path = tmp_path / "index.json"
+    index = ModelIndex(str(index_path))
+    index.lookup(str(tmp_path / "tree"), PATTERNS, INDICATORS)
+
+    second = make_model(tmp_path, "stable-diffusion-b", indicators=("unet",))
+    bump_mtime(tmp_path / "tree" / "models")
+    models, cached = index.lookup(str(tmp_path / "tree"), PATTERNS, INDICATORS)
+    assert not cached
+    assert [m["path"] for m in models] == [first, second]
+    assert models[1]["indicators"] == ["unet"]
+
+    # The rewritten file holds the rescan, and a new process trusts it
+    (entry,) = json.loads(index_path.read_text()).values()
+    assert entry["models"] == models
+    assert ModelIndex(str(index_path)).lookup(str(tmp_path / "tree"), PATTERNS, INDICATORS) == (models, True)
+
+
+def test_change_inside_a_model_directory_is_noticed(tmp_path):
+    model = make_model(tmp_path, "stable-diffusion-a", indicators=("unet",))
+    index = ModelIndex(str(tmp_path / "index.json"))
+    index.lookup(str(tmp_path / "tree"), PATTERNS, INDICATORS)
+    os.mkdir(os.path.join(model, "model_index.json"))
+    bump_mtime(model)
+    models, cached = index.lookup(str(tmp_path / "tree"), PATTERNS, INDICATORS)
+    assert not cached
+    assert models[0]["indicators"] == list(INDICATORS)
+
+
+def test_refresh_forces_a_rescan(tmp_path):
+    make_model(tmp_path, "stable-diffusion-a")
+    index = ModelIndex(str(tmp_path / "index.json"))
+    index.lookup(str(tmp_path / "tree"), PATTERNS, INDICATORS)
+    assert index.lookup(str(tmp_path / "tree"), PATTERNS, INDICATORS, refresh=True)[1] is False
@@ -0,0 +1,104 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("diffusers")
+
+import model_pool
+
+
+class FakePipe:
+    def __init__(self, model_id, shared):
+        torch.manual_seed(hash(model_id) % 1000)
+        self.unet = torch.nn.Linear(16, 16)
+        # Same weights in every model, like a common text encoder
+        self.text_encoder = shared
+
+    @property
+    def components(self):
+        return {"unet": self.unet, "text_encoder": self.text_encoder, "scheduler": None}
+
+    def to(self, device):
+        return self
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    shared = torch.nn.Linear(8, 8)
+    loads = []
+
+    class FakeLoader:
+        @staticmethod
+        def from_pretrained(model_id, **kwargs):
+            loads.append(model_id)
+            return FakePipe(model_id, shared)
+
+    monkeypatch.setattr(model_pool, "StableDiffusionPipeline", FakeLoader)
+    unet_bytes = model_pool.component_bytes(torch.nn.Linear(16, 16))
+    shared_bytes = model_pool.component_bytes(shared)
+    # Room for two models sharing the text encoder, not three
+    pool = model_pool.ModelPool(budget_bytes=2 * unet_bytes + shared_bytes, device="cpu")
+    pool.loads = loads
+    return pool
+
+
+def test_identical_components_are_shared(pool):
+    a = pool.get("a")
+    b = pool.get("b")
+    assert a.text_encoder is b.text_encoder
+    assert pool.stats()["shared_savings_bytes"] == model_pool.component_bytes(a.text_encoder)
+
+
+def test_get_reuses_loaded_pipeline(pool):
+    assert pool.get("a") is pool.get("a")
+    assert pool.loads == ["a"]
+    assert pool.lookup("missing") is None
+
+
+def test_least_recently_used_model_is_evicted(pool):
+    pool.get("a")
+    pool.get("b")
+    pool.lookup("a")
+    pool.get("c")
+    assert pool.stats()["models"] == ["a", "c"]
+    assert pool.evictions == 1
+
+
+def test_pinned_model_is_never_evicted(pool):
+    pool.pin("a")
+    pool.get("a")
+    pool.get("b")
+    pool.get("c")
+    pool.get("d")
+    assert pool.stats()["models"] == ["a", "d"]
+    assert pool.used_bytes() <= pool.budget_bytes
+
+
+def test_shared_names_lists_components_other_models_use(pool):
+    a = pool.get("a")
+    assert pool.shared_names(a) == []
+    b = pool.get("b")
+    assert pool.shared_names(a) == pool.shared_names(b) == ["text_encoder"]
+
+
+def test_cpu_profile_leaves_shared_components_alone():
+    import cpu_profile
+
+    class ConvPipe:
+        def __init__(self, vae):
+            self.unet = torch.nn.Conv2d(4, 4, 3)
+            self.vae = vae
+            self.slicing = None
+
+        def enable_attention_slicing(self):
+            self.slicing = True
+
+        def disable_attention_slicing(self):
+            self.slicing = False
+
+    vae = torch.nn.Conv2d(4, 4, 3)
+    pipe = ConvPipe(vae)
+    cpu_profile._shared[pipe] = frozenset({"vae"})
+    cpu_profile.apply_config(pipe, {**cpu_profile.default_config(), "channels_last": True})
+    assert pipe.unet.weight.is_contiguous(memory_format=torch.channels_last)
+    assert vae.weight.is_contiguous()
+    assert pipe.slicing is False
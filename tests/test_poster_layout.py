@@ -0,0 +1,28 @@
+import numpy as np
+from PIL import Image
+
+import poster_layout
+
+
+def background():
+    rng = np.random.default_rng(3)
+    return Image.fromarray(rng.integers(0, 256, (300, 240, 3), dtype=np.uint8), "RGB")
+
+
+def test_stamping_a_base_matches_the_full_layout():
+    logo = Image.new("RGBA", (40, 30), (255, 0, 0, 200))
+    full = poster_layout.apply_text_layout(background(), "Tech Summit", "Dec 15\nHall A", logo)
+    base = poster_layout.create_base_layer(background(), logo)
+    stamped = poster_layout.stamp_text(base, "Tech Summit", "Dec 15\nHall A")
+    assert (np.asarray(full) == np.asarray(stamped)).all()
+
+
+def test_layers_scale_with_the_poster():
+    small = poster_layout.layout_layers(240, 300, "Title", "Line", scale=1.0)
+    large = poster_layout.layout_layers(960, 1200, "Title", "Line", scale=4.0)
+    assert len(small) == len(large) == 2
+    assert large[1][1][1] > small[1][1][1] * 3
+
+
+def test_missing_logo_is_none():
+    assert poster_layout.process_logo(None) is None
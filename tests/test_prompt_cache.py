@@ -0,0 +1,75 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from prompt_cache import PromptEmbeddingCache
+
+
+class FakeTokenizer:
+    model_max_length = 8
+
+    def __call__(self, prompt, padding, max_length, truncation):
+        ids = [ord(c) for c in prompt][:max_length]
+        ids += [0] * (max_length - len(ids))
+        return type("Tokens", (), {"input_ids": ids})()
+
+
+class FakePipe:
+    device = "cpu"
+
+    def __init__(self, name):
+        self.config = {"_name_or_path": name}
+        self.tokenizer = FakeTokenizer()
+        self.encoded = []
+
+    def encode_prompt(self, prompt, device, count, guidance):
+        self.encoded.append(prompt)
+        return torch.full((1, 8, 4), float(len(self.encoded))), None
+
+
+def test_identical_prompt_is_a_hit():
+    cache = PromptEmbeddingCache()
+    pipe = FakePipe("a")
+    first = cache.encode(pipe, "sunset")
+    assert cache.encode(pipe, "sunset") is first
+    assert pipe.encoded == ["sunset"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_prompts_equal_after_truncation_share_an_entry():
+    cache = PromptEmbeddingCache()
+    pipe = FakePipe("a")
+    cache.encode(pipe, "eight ch+one")
+    cache.encode(pipe, "eight ch+two")
+    assert len(pipe.encoded) == 1
+
+
+def test_other_model_is_a_miss():
+    cache = PromptEmbeddingCache()
+    a, b = FakePipe("a"), FakePipe("b")
+    cache.encode(a, "sunset")
+    cache.encode(b, "sunset")
+    assert b.encoded == ["sunset"]
+    assert cache.stats()["misses"] == 2
+
+
+def test_pinned_negative_prompt_survives_eviction():
+    cache = PromptEmbeddingCache(max_entries=2)
+    pipe = FakePipe("a")
+    negative = cache.encode(pipe, "blurry", pin=True)
+    for prompt in ("one", "two", "three"):
+        cache.encode(pipe, prompt)
+    assert cache.encode(pipe, "blurry", pin=True) is negative
+    cache.encode(pipe, "one")
+    assert pipe.encoded == ["blurry", "one", "two", "three", "one"]
+    assert cache.stats()["entries"] == 2 and cache.stats()["pinned"] == 1
+
+
+def test_warm_after_a_streak_of_hits():
+    cache = PromptEmbeddingCache()
+    pipe = FakePipe("a")
+    cache.encode(pipe, "sunset")
+    cache.encode(pipe, "sunset")
+    assert not cache.warm(2)
+    cache.encode(pipe, "sunset")
+    assert cache.warm(2)
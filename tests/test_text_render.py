@@ -0,0 +1,27 @@
+import pytest
+from PIL import ImageFont
+
+import fonts
+import text_render
+
+
+def test_sprites_are_cached_within_the_byte_budget(monkeypatch):
+    font = fonts.registry.get(40)
+    if not isinstance(getattr(font, "path", None), str):
+        pytest.skip("no TrueType font installed; only file-backed fonts are cached")
+    first = text_render.outlined_text("Tech Summit", font, "white", "black")
+    assert text_render.outlined_text("Tech Summit", font, "white", "black") is first
+
+    budget = 2 * first.image.width * first.image.height * 4
+    monkeypatch.setattr(text_render, "CACHE_MAX_BYTES", budget)
+    for i in range(10):
+        text_render.outlined_text(f"Tech Summit {i}", font, "white", "black")
+    assert text_render.cache_info()["bytes"] <= budget
+
+
+def test_sprite_is_centred_on_its_advance_width():
+    font = ImageFont.load_default()
+    sprite = text_render.outlined_text("Hello", font, "white", "black", stroke_width=2)
+    assert sprite.image.mode == "RGBA"
+    assert sprite.text_width > 0
+    assert sprite.image.width >= sprite.text_width
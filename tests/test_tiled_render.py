@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import tiled_render
+
+
+def test_tile_starts_cover_with_overlap():
+    starts = tiled_render.tile_starts(1000, 256, 64)
+    assert starts[0] == 0 and starts[-1] == 1000 - 256
+    assert all(b - a <= 256 - 64 for a, b in zip(starts, starts[1:]))
+    assert tiled_render.tile_starts(200, 256, 64) == [0]
+
+
+def test_canvas_blends_constant_tiles_exactly():
+    canvas = tiled_render.TiledCanvas(300, 200, tile=128, overlap=32)
+    bands = []
+    canvas.render(lambda x, y, w, h: np.full((h, w, 3), 77, dtype=np.uint8),
+                  lambda y, rows: bands.append((y, rows)))
+    image = np.concatenate([rows for _, rows in bands])
+    assert image.shape == (200, 300, 3)
+    assert (image == 77).all()
+    assert [y for y, _ in bands] == sorted(y for y, _ in bands)
+
+
+def test_tiled_upscale_matches_a_direct_resize():
+    rng = np.random.default_rng(1)
+    source = Image.fromarray(rng.integers(0, 256, (48, 64, 3), dtype=np.uint8), "RGB")
+    width, height = 320, 240
+    canvas = tiled_render.TiledCanvas(width, height, tile=96, overlap=16)
+    out = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def emit(y, rows):
+        out[y:y + len(rows)] = rows
+
+    canvas.render(tiled_render.upscaler(source, width, height), emit)
+    expected = np.asarray(source.resize((width, height), Image.Resampling.LANCZOS), dtype=int)
+    assert np.abs(out.astype(int) - expected).max() <= 2
+
+
+def test_streaming_png_round_trips(tmp_path):
+    rng = np.random.default_rng(2)
+    pixels = rng.integers(0, 256, (50, 40, 3), dtype=np.uint8)
+    path = str(tmp_path / "poster.png")
+    with tiled_render.StreamingPNGWriter(path, 40, 50, compress_level=1) as writer:
+        for y in range(0, 50, 16):
+            writer.write(pixels[y:y + 16])
+    with Image.open(path) as image:
+        assert (np.asarray(image) == pixels).all()
+
+
+def test_streaming_png_aborts_incomplete_files(tmp_path):
+    path = str(tmp_path / "poster.png")
+    with pytest.raises(ValueError):
+        with tiled_render.StreamingPNGWriter(path, 8, 8) as writer:
+            writer.write(np.zeros((4, 8, 3), dtype=np.uint8))
+    assert list(tmp_path.iterdir()) == []
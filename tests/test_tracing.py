@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+import encoding
+import tracing
+from batching import MicroBatcher
+
+
+def run_batch(key, items):
+    with tracing.stage("diffusion"):
+        return [item * 2 for item in items]
+
+
+def test_batch_stages_reach_every_request_trace():
+    batcher = MicroBatcher(run_batch, max_batch_size=2, max_wait=1.0)
+    traces = {}
+    results = {}
+
+    def request(n):
+        with tracing.request_trace("render") as trace:
+            traces[n] = trace
+            results[n] = batcher("key", n)
+
+    threads = [threading.Thread(target=request, args=(n,)) for n in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {1: 2, 2: 4}
+    assert batcher.stats()["batches_run"] == 1
+    for trace in traces.values():
+        assert [span["stage"] for span in trace.spans] == ["diffusion"]
+
+
+def test_encode_pool_stages_reach_the_request_trace():
+    encoding.clear_cache()
+    image = Image.new("RGB", (64, 48), "teal")
+    with tracing.request_trace("render") as trace:
+        encoding.derivatives(image, names=["thumbnail", "web"])
+    assert sum(span["stage"] == "encode" for span in trace.spans) == 2
+
+
+def test_stages_outside_a_request_are_not_traced():
+    with tracing.stage("idle"):
+        pass
+    assert tracing.current_traces() == ()
+
+
+def test_stage_peak_is_per_stage_not_process_lifetime():
+    if tracing._current_rss() is None:
+        pytest.skip("needs /proc/self/statm")
+
+    def allocate(n):
+        block = b"\x01" * n
+        time.sleep(0.05)
+        del block
+
+    with tracing.request_trace("render") as trace:
+        with tracing.stage("load"):
+            allocate(96 * 2**20)
+        # A smaller stage after a larger one still reports its own peak
+        with tracing.stage("render"):
+            allocate(32 * 2**20)
+    peaks = {span["stage"]: span["peak_rss_growth_bytes"] for span in trace.spans}
+    assert peaks["render"] >= 24 * 2**20
+    assert peaks["load"] >= 72 * 2**20
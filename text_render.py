@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+from PIL import Image, ImageDraw, ImageFilter
+
+# image: RGBA sprite; offset: sprite position relative to the text origin;
+# text_width: advance box width without the outline, used for centring
+TextSprite = namedtuple("TextSprite", ["image", "offset", "text_width"])
+
+# Total RGBA bytes of cached sprites; least recently drawn text goes first
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_sprites = OrderedDict()
+_sprites_bytes = 0
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _font_key(font):
+    path = getattr(font, "path", None)
+    if not isinstance(path, str):
+        return None
+    return (path, getattr(font, "size", None), getattr(font, "index", 0))
+
+
+def _rasterize(text, font, fill_color, outline_color, stroke_width):
+    box = font.getbbox(text)
+    text_width = box[2] - box[0]
+    try:
+        # Native stroke: outline and fill come out of a single rasterization
+        measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+        left, top, right, bottom = measure.textbbox((0, 0), text, font=font, stroke_width=stroke_width)
+        sprite = Image.new("RGBA", (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+        ImageDraw.Draw(sprite).text(
+            (-left, -top), text, font=font, fill=fill_color,
+            stroke_width=stroke_width, stroke_fill=outline_color
+        )
+        return TextSprite(sprite, (left, top), text_width)
+    except (TypeError, ValueError, OSError):
+        pass
+
+    # Bitmap fonts have no stroke support: dilate the glyph mask instead
+    pad = stroke_width
+    size = (box[2] - box[0] + 2 * pad, box[3] - box[1] + 2 * pad)
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).text((pad - box[0], pad - box[1]), text, font=font, fill=255)
+    outline_mask = mask.filter(ImageFilter.MaxFilter(2 * stroke_width + 1))
+    sprite = Image.new("RGBA", size, outline_color)
+    sprite.putalpha(outline_mask)
+    sprite.paste(Image.new("RGBA", size, fill_color), (0, 0), mask)
+    return TextSprite(sprite, (box[0] - pad, box[1] - pad), text_width)
+
+
+def _sprite_bytes(sprite):
+    return sprite.image.width * sprite.image.height * 4
+
+
+def outlined_text(text, font, fill_color, outline_color, stroke_width=2):
+    """Return a cached TextSprite of `text` with an outline of `stroke_width` pixels."""
+    global _sprites_bytes
+    font_key = _font_key(font)
+    if font_key is None:
+        return _rasterize(text, font, fill_color, outline_color, stroke_width)
+
+    key = (text, font_key, fill_color, outline_color, stroke_width)
+    with _lock:
+        sprite = _sprites.get(key)
+        if sprite is not None:
+            _sprites.move_to_end(key)
+            _stats["hits"] += 1
+            return sprite
+        _stats["misses"] += 1
+
+    sprite = _rasterize(text, font, fill_color, outline_color, stroke_width)
+    size = _sprite_bytes(sprite)
+    if size <= CACHE_MAX_BYTES:
+        with _lock:
+            if key not in _sprites:
+                _sprites[key] = sprite
+                _sprites_bytes += size
+            while _sprites_bytes > CACHE_MAX_BYTES and _sprites:
+                _, evicted = _sprites.popitem(last=False)
+                _sprites_bytes -= _sprite_bytes(evicted)
+    return sprite
+
+
+def cache_info():
+    with _lock:
+        return {**_stats, "entries": len(_sprites), "bytes": _sprites_bytes}
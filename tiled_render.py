@@ -0,0 +1,231 @@
+"""Memory-bounded rendering of print-size images.
+
+The output is produced in overlapping tiles that are cross-faded into a
+single band buffer one tile row at a time. As soon as a row of tiles is done,
+the rows no later tile can touch are handed to `emit` and the buffer moves
+down, so memory is bounded by one tile row (tile height x image width) and
+never by the image height. StreamingPNGWriter compresses emitted rows straight
+to disk, so the full image never exists in memory either.
+"""
+import os
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+TILE_SIZE = int(os.getenv("POSTER_PRINT_TILE", "512"))
+TILE_OVERLAP = int(os.getenv("POSTER_PRINT_TILE_OVERLAP", "64"))
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def tile_starts(length, tile, overlap):
+    """Start offsets covering `length` with tiles of `tile` overlapping by at least `overlap`."""
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, tile - overlap))
+    starts.append(length - tile)
+    return starts
+
+
+def _ramps(starts, tile):
+    """Per-tile blend weights along one axis: linear cross-fades where neighbours overlap."""
+    ramps = []
+    for i, start in enumerate(starts):
+        weights = np.ones(tile, dtype=np.float32)
+        if i > 0:
+            lead = starts[i - 1] + tile - start
+            weights[:lead] = np.arange(1, lead + 1, dtype=np.float32) / (lead + 1)
+        if i + 1 < len(starts):
+            trail = start + tile - starts[i + 1]
+            fade = np.arange(trail, 0, -1, dtype=np.float32) / (trail + 1)
+            weights[tile - trail:] = np.minimum(weights[tile - trail:], fade)
+        ramps.append(weights)
+    return ramps
+
+
+class TiledCanvas:
+    """Blends overlapping tiles into finished rows with a band-sized buffer."""
+
+    def __init__(self, width, height, tile=TILE_SIZE, overlap=TILE_OVERLAP):
+        self.width = width
+        self.height = height
+        self.tile_width = min(tile, width)
+        self.tile_height = min(tile, height)
+        overlap = min(overlap, max(0, min(self.tile_width, self.tile_height) // 2))
+        self.xs = tile_starts(width, self.tile_width, overlap)
+        self.ys = tile_starts(height, self.tile_height, overlap)
+
+    @property
+    def tile_count(self):
+        return len(self.xs) * len(self.ys)
+
+    def buffer_bytes(self):
+        # float32 RGB accumulator plus float32 weights
+        return self.tile_height * self.width * 4 * 4
+
+    def render(self, render_tile, emit, progress=None):
+        """Call `render_tile(x, y, w, h) -> (h, w, 3) uint8` per tile and `emit(y, rows)` per finished band.
+
+        `progress(done, total)` is called after every tile.
+        """
+        tw, th = self.tile_width, self.tile_height
+        x_ramps = _ramps(self.xs, tw)
+        y_ramps = _ramps(self.ys, th)
+        acc = np.zeros((th, self.width, 3), dtype=np.float32)
+        weight = np.zeros((th, self.width), dtype=np.float32)
+        done = 0
+
+        for j, y in enumerate(self.ys):
+            for i, x in enumerate(self.xs):
+                pixels = np.asarray(render_tile(x, y, tw, th), dtype=np.float32)
+                if pixels.shape != (th, tw, 3):
+                    raise ValueError(f"Tile at {x},{y} is {pixels.shape}, expected {(th, tw, 3)}")
+                blend = np.outer(y_ramps[j], x_ramps[i])
+                acc[:, x:x + tw] += pixels * blend[:, :, None]
+                weight[:, x:x + tw] += blend
+                done += 1
+                if progress is not None:
+                    progress(done, self.tile_count)
+
+            # Rows above the next tile row's start can no longer change
+            finished = (self.ys[j + 1] if j + 1 < len(self.ys) else self.height) - y
+            rows = acc[:finished] / weight[:finished, :, None]
+            emit(y, np.clip(rows + 0.5, 0, 255).astype(np.uint8))
+            acc[:th - finished] = acc[finished:]
+            acc[th - finished:] = 0
+            weight[:th - finished] = weight[finished:]
+            weight[th - finished:] = 0
+
+
+def upscaler(source, width, height, resample=Image.Resampling.LANCZOS):
+    """Tile source that resamples only the matching region of a small `source` image."""
+    if source.mode != "RGB":
+        source = source.convert("RGB")
+    scale_x = source.width / width
+    scale_y = source.height / height
+
+    def render_tile(x, y, w, h):
+        box = (x * scale_x, y * scale_y, (x + w) * scale_x, (y + h) * scale_y)
+        return source.resize((w, h), resample, box=box)
+
+    return render_tile
+
+
+class TileRefiner:
+    """Tile source that re-diffuses upscaled tiles with img2img to add real detail.
+
+    Every tile is VAE-encoded, partially re-noised (`strength`), denoised with
+    the poster prompt and decoded on its own, so neither the latents nor the
+    VAE decoder activations ever cover more than one tile.
+    """
+
+    def __init__(self, pipe, render_tile, prompt_embeds, negative_prompt_embeds,
+                 strength=0.3, steps=20, guidance_scale=7.5, seed=0, on_step=None):
+        from diffusers import StableDiffusionImg2ImgPipeline
+
+        components = dict(pipe.components)
+        # Scheduler state is per call; don't share it with the text-to-image pipe
+        components["scheduler"] = type(pipe.scheduler).from_config(pipe.scheduler.config)
+        self.pipe = StableDiffusionImg2ImgPipeline(**components)
+        self.pipe.set_progress_bar_config(disable=True)
+        self.render_tile = render_tile
+        self.prompt_embeds = prompt_embeds
+        self.negative_prompt_embeds = negative_prompt_embeds
+        self.strength = strength
+        self.steps = steps
+        self.guidance_scale = guidance_scale
+        self.seed = seed
+        self.on_step = on_step
+
+    def __call__(self, x, y, w, h):
+        import torch
+
+        tile = self.render_tile(x, y, w, h)
+        # The VAE works in multiples of 8 pixels
+        work_size = (max(8, w // 8 * 8), max(8, h // 8 * 8))
+        image = tile if tile.size == work_size else tile.resize(work_size, Image.Resampling.LANCZOS)
+        # A seed per tile position keeps re-renders identical
+        generator = torch.Generator(device=self.pipe.device).manual_seed(self.seed + 7919 * y + x)
+        kwargs = {}
+        if self.on_step is not None:
+            kwargs["callback_on_step_end"] = self.on_step
+        refined = self.pipe(
+            prompt_embeds=self.prompt_embeds,
+            negative_prompt_embeds=self.negative_prompt_embeds,
+            image=image,
+            strength=self.strength,
+            num_inference_steps=self.steps,
+            guidance_scale=self.guidance_scale,
+            generator=generator,
+            **kwargs
+        ).images[0]
+        return refined if refined.size == (w, h) else refined.resize((w, h), Image.Resampling.LANCZOS)
+
+
+class StreamingPNGWriter:
+    """Writes an RGB PNG band by band; the file appears (atomically) on close."""
+
+    def __init__(self, path, width, height, compress_level=6):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._tmp_path = path + ".tmp"
+        self._compressor = zlib.compressobj(compress_level)
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(PNG_SIGNATURE)
+        # 8-bit RGB, deflate, adaptive filtering, no interlace
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def write(self, rows):
+        rows = np.asarray(rows, dtype=np.uint8)
+        if rows.ndim != 3 or rows.shape[1:] != (self.width, 3):
+            raise ValueError(f"Expected (n, {self.width}, 3) rows, got {rows.shape}")
+        if self.rows_written + len(rows) > self.height:
+            raise ValueError("More rows than the image height")
+        flat = rows.reshape(len(rows), -1)
+        # "Sub" filter: each byte minus the same channel of the previous pixel
+        filtered = np.empty((len(rows), flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = flat[:, :3]
+        filtered[:, 4:] = flat[:, 3:] - flat[:, :-3]
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"Wrote {self.rows_written} of {self.height} rows")
+            self._chunk(b"IDAT", self._compressor.flush())
+            self._chunk(b"IEND", b"")
+            self._file.close()
+            os.replace(self._tmp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,327 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+import status_server
+
+TRACE_DIR = os.getenv("POSTER_TRACE_DIR")
+TRACE_MIN_SECONDS = float(os.getenv("POSTER_TRACE_MIN_SECONDS", "0"))
+# How often RSS is sampled while a stage runs, for its peak
+RSS_SAMPLE_SECONDS = float(os.getenv("POSTER_RSS_SAMPLE_SECONDS", "0.005"))
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BYTES_BUCKETS = tuple(2 ** 20 * 4 ** i for i in range(7))  # 1 MiB .. 4 GiB
+
+_metrics = []
+_collectors = []
+# The request's Trace, or a tuple of Traces while running work shared by several requests
+_current_trace = contextvars.ContextVar("poster_trace", default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] += amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series["counts"]):
+                    out.append((f"{self.name}_bucket", key + (("le", repr(float(bound))),), count))
+                out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), series["count"]))
+                out.append((f"{self.name}_sum", key, series["sum"]))
+                out.append((f"{self.name}_count", key, series["count"]))
+        return out
+
+
+def collector(fn):
+    """Register `fn() -> [(name, help, value, labels_dict), ...]`, exported as gauges on every scrape."""
+    _collectors.append(fn)
+    return fn
+
+
+def render_metrics():
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, key, value in metric.samples():
+            lines.append(f"{name}{_format_labels(key)} {value}")
+    seen = set()
+    for fn in _collectors:
+        try:
+            gauges = fn()
+        except Exception as e:
+            print(f"Metrics collector error: {e}")
+            continue
+        for name, help_text, value, labels in gauges:
+            if name not in seen:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                seen.add(name)
+            lines.append(f"{name}{_format_labels(_label_key(labels))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+@status_server.route("/metrics")
+def metrics_endpoint():
+    return 200, "text/plain; version=0.0.4", render_metrics()
+
+
+stage_seconds = Histogram("poster_stage_seconds", "Wall time per generation stage")
+stage_rss_growth = Histogram(
+    "poster_stage_rss_growth_bytes", "Peak RSS during a stage above the RSS it started at", BYTES_BUCKETS
+)
+stage_errors = Counter("poster_stage_errors_total", "Stages that raised")
+diffusion_step_seconds = Histogram("poster_diffusion_step_seconds", "Wall time per diffusion step")
+requests_total = Counter("poster_requests_total", "Traced requests by outcome")
+
+
+def _current_rss():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Watch:
+    def __init__(self, start):
+        self.start = start
+        self.peak = start
+
+
+class PeakSampler:
+    """Samples RSS on one background thread while any stage is open; each stage keeps its own peak.
+
+    The process high-water mark (ru_maxrss) never comes down, so once the
+    model is loaded it says nothing about the stages that follow.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self._watches = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread = None
+
+    def start(self):
+        rss = _current_rss()
+        if rss is None:
+            return None
+        watch = _Watch(rss)
+        with self._lock:
+            self._watches.add(watch)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return watch
+
+    def stop(self, watch):
+        """Bytes the stage's peak RSS rose above its starting RSS, None where RSS can't be read."""
+        if watch is None:
+            return None
+        rss = _current_rss()
+        with self._lock:
+            self._watches.discard(watch)
+            if rss is not None and rss > watch.peak:
+                watch.peak = rss
+        return watch.peak - watch.start
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._watches:
+                    self._wake.wait()
+            rss = _current_rss()
+            if rss is not None:
+                with self._lock:
+                    for watch in self._watches:
+                        if rss > watch.peak:
+                            watch.peak = rss
+            time.sleep(self.interval)
+
+
+peak_sampler = PeakSampler()
+
+
+@contextlib.contextmanager
+def stage(name, **labels):
+    """Time a stage, record its peak RSS above where it started, and add it to the current trace."""
+    started = time.perf_counter()
+    watch = peak_sampler.start()
+    rss_before = watch.start if watch is not None else None
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        stage_errors.inc(stage=name, **labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        peak_growth = peak_sampler.stop(watch)
+        stage_seconds.observe(elapsed, stage=name, **labels)
+        if peak_growth is not None:
+            stage_rss_growth.observe(peak_growth, stage=name, **labels)
+        traces = current_traces()
+        rss_after = _current_rss() if traces else None
+        for trace in traces:
+            trace.add_span({
+                "stage": name,
+                "labels": labels,
+                "start_ms": round((started - trace.started) * 1000, 3),
+                "duration_ms": round(elapsed * 1000, 3),
+                "peak_rss_growth_bytes": peak_growth,
+                "rss_delta_bytes": rss_after - rss_before if rss_after is not None and rss_before is not None else None,
+                "error": repr(error) if error is not None else None,
+            })
+
+
+class Trace:
+    def __init__(self, name, attributes):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.wall_start = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self, total_seconds, outcome):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "attributes": self.attributes,
+            "started_at": self.wall_start,
+            "total_ms": round(total_seconds * 1000, 3),
+            "outcome": outcome,
+            "spans": self.spans,
+        }
+
+
+def current_traces():
+    """Traces the running code belongs to: one per request, several inside a shared batch."""
+    current = _current_trace.get()
+    if current is None:
+        return ()
+    return current if isinstance(current, tuple) else (current,)
+
+
+@contextlib.contextmanager
+def shared_traces(traces):
+    """Record the stages of work done once for several requests (a micro-batch) in each of their traces."""
+    token = _current_trace.set(tuple(traces) or None)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+
+
+@contextlib.contextmanager
+def request_trace(name, **attributes):
+    """Collect the stages of one request; written to POSTER_TRACE_DIR when that is set."""
+    trace = Trace(name, attributes)
+    token = _current_trace.set(trace)
+    outcome = "ok"
+    try:
+        yield trace
+    except BaseException as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        _current_trace.reset(token)
+        total = time.perf_counter() - trace.started
+        requests_total.inc(request=name, outcome=outcome)
+        if TRACE_DIR and total >= TRACE_MIN_SECONDS:
+            _write_trace(trace.to_dict(total, outcome))
+
+
+def _write_trace(payload):
+    try:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        path = os.path.join(TRACE_DIR, f"{int(payload['started_at'])}-{payload['id']}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, default=str)
+    except OSError as e:
+        print(f"Trace write error: {e}")
+
+
+class StepTimer:
+    """Diffusion step callback helper: observes the time between consecutive steps."""
+
+    def __init__(self, **labels):
+        self.labels = labels
+        self._last = time.perf_counter()
+
+    def tick(self):
+        now = time.perf_counter()
+        diffusion_step_seconds.observe(now - self._last, **self.labels)
+        for trace in current_traces():
+            trace.add_span({
+                "stage": "diffusion_step",
+                "labels": self.labels,
+                "start_ms": round((self._last - trace.started) * 1000, 3),
+                "duration_ms": round((now - self._last) * 1000, 3),
+            })
+        self._last = now
@@ -1,165 +1,667 @@
 import gradio as gr
 import torch
-from diffusers import StableDiffusionPipeline, DPMSolverMultistepScheduler
-from PIL import Image, ImageDraw, ImageFont
+from diffusers import DPMSolverMultistepScheduler
+from PIL import Image
 import numpy as np
 import os
+import random
+import tempfile
+import uuid
+
+import threading
+import time
+from collections import namedtuple
+
+import cpu_profile
+import encoding
+import fonts
+import gradients
+import latency_budget
+import logos
+import low_memory
+import poster_layout
+import status_server
+import tiled_render
+import tracing
+from background_cache import BackgroundCache, cache_key
+from batching import MicroBatcher
+from compositor import PosterCompositor
+from jobs import JobCancelled, JobManager, JobQueueFull
+from model_pool import ModelPool
+from prompt_cache import PromptEmbeddingCache
+
+NEGATIVE_PROMPT = "blurry, distorted, bad anatomy, low quality"
+NUM_INFERENCE_STEPS = 35
+GUIDANCE_SCALE = 7.5
+# Job progress at which text and logo composition starts; rendering fills the bar up to here
+COMPOSE_PROGRESS = 0.95
+# Share of the bar the background gets when print tiles are rendered after it
+PRINT_BACKGROUND_PROGRESS = 0.6
+# Seed for batch, mail-merge and other scripted renders, so reruns hit the
+# background cache; the UI picks a random one unless the user sets a seed
+DEFAULT_SEED = 1234
+MAX_BATCH_SIZE = int(os.getenv("POSTER_MAX_BATCH", "4"))
+BATCH_WAIT_MS = int(os.getenv("POSTER_BATCH_WAIT_MS", "50"))
+JOB_WORKERS = int(os.getenv("POSTER_JOB_WORKERS", str(MAX_BATCH_SIZE)))
+MAX_QUEUED_JOBS = int(os.getenv("POSTER_MAX_QUEUE", "16"))
+# A latency_budget preset, or "deadline" to fit DEADLINE_SECONDS
+QUALITY = os.getenv("POSTER_QUALITY", "final")
+QUALITY_CHOICES = list(latency_budget.PRESETS) + [latency_budget.DEADLINE]
+DEADLINE_SECONDS = float(os.getenv("POSTER_DEADLINE_SECONDS", "60"))
+OUTPUT_DIR = os.getenv("POSTER_OUTPUT_DIR", os.path.join(tempfile.gettempdir(), "poster_outputs"))
+OUTPUT_FILES_KEEP = int(os.getenv("POSTER_OUTPUT_FILES_KEEP", "192"))
+# Paper sizes in portrait pixels; landscape aspect ratios rotate them
+PRINT_SIZES = {
+    "Screen only": None,
+    "A3 print (300 dpi)": (3508, 4961),
+    "A2 print (300 dpi)": (4961, 7016),
+}
+PRINT_FILES_KEEP = int(os.getenv("POSTER_PRINT_FILES_KEEP", "8"))
+# img2img strength for re-diffusing each upscaled tile; 0 keeps plain upscaling
+PRINT_REFINE_STRENGTH = float(os.getenv("POSTER_PRINT_REFINE_STRENGTH", "0"))
+PRINT_REFINE_STEPS = int(os.getenv("POSTER_PRINT_REFINE_STEPS", "20"))
+ASPECT_RATIOS = {
+    "1:1 - Square": (1024, 1024),
+    "2:3 - Portrait": (683, 1024),
+    "3:2 - Landscape": (1024, 683),
+    "3:4 - Poster": (768, 1024),
+    "16:9 - Widescreen": (1024, 576)
+}
+AVAILABLE_MODELS = [m.strip() for m in os.getenv(
+    "POSTER_MODELS", "prompthero/openjourney,runwayml/stable-diffusion-v1-5"
+).split(",") if m.strip()]
+
+# image: the background; from_model: False when it is the gradient fallback
+Background = namedtuple("Background", ["image", "from_model"])
+
+MODEL_COLD = "cold"
+MODEL_LOADING = "loading"
+MODEL_READY = "ready"
+MODEL_FAILED = "failed"
 
 class SimplePosterGenerator:
     def __init__(self):
         self.pipe = None
-        self.load_model()
+        self.model_id = AVAILABLE_MODELS[0]
+        self.model_pool = ModelPool()
+        self.prompt_cache = PromptEmbeddingCache()
+        self.model_state = MODEL_COLD
+        self.model_error = None
+        self.model_load_seconds = None
+        self._warmup_thread = None
+        self._warmup_lock = threading.Lock()
+        self._ready = threading.Event()
+        self.background_cache = BackgroundCache()
+        self.batcher = MicroBatcher(self._run_background_batch, MAX_BATCH_SIZE, BATCH_WAIT_MS / 1000)
+        print(f"🔤 Indexed {fonts.registry.scan()} system fonts")
+
+    def start_warmup(self):
+        # Load the pipeline off the request path; until it is ready posters
+        # are served on the gradient fallback
+        with self._warmup_lock:
+            if self._warmup_thread is None:
+                self._warmup_thread = threading.Thread(target=self.load_model, name="model-warmup", daemon=True)
+                self._warmup_thread.start()
+        return self._warmup_thread
+
+    def wait_until_ready(self, timeout=None):
+        self.start_warmup()
+        self._ready.wait(timeout)
+        return self.model_state == MODEL_READY
+
+    def readiness(self):
+        return {
+            "state": self.model_state,
+            "model_id": self.model_id,
+            "ready": self.model_state == MODEL_READY,
+            "load_seconds": self.model_load_seconds,
+            "error": self.model_error,
+        }
 
     def load_model(self):
+        self.model_state = MODEL_LOADING
+        started = time.perf_counter()
         try:
             torch.cuda.empty_cache()
-            model_id = "prompthero/openjourney"
-            token = os.getenv("HF_TOKEN")
-            if token:
-                print("🔐 Using Hugging Face token for model loading.")
+            # self.pipe keeps the default model alive, so the pool must never evict it
+            self.model_pool.pin(self.model_id)
+            pipe = self.load_pipeline(self.model_id)
 
-            self.pipe = StableDiffusionPipeline.from_pretrained(
+            # Publish only the fully configured pipeline to request threads
+            self.pipe = pipe
+            self.model_state = MODEL_READY
+            self.model_error = None
+
+        except Exception as e:
+            print(f"❌ Error loading model: {e}")
+            self.pipe = None
+            self.model_state = MODEL_FAILED
+            self.model_error = str(e)
+        finally:
+            self.model_load_seconds = round(time.perf_counter() - started, 2)
+            self._ready.set()
+
+    def _configure_pipe(self, pipe):
+        pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
+        if self.model_pool.device == "cpu":
+            pipe = cpu_profile.optimize(pipe, shared=self.model_pool.shared_names(pipe))
+        return pipe
+
+    def load_pipeline(self, model_id):
+        token = os.getenv("HF_TOKEN")
+        if token:
+            print("🔐 Using Hugging Face token for model loading.")
+
+        with tracing.stage("load_model", model=model_id):
+            pipe = self.model_pool.get(
                 model_id,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+                configure=self._configure_pipe,
                 safety_checker=None,
                 requires_safety_checker=False,
                 use_auth_token=token
             )
-
-            self.pipe.scheduler = DPMSolverMultistepScheduler.from_config(self.pipe.scheduler.config)
-
-            if torch.cuda.is_available():
-                self.pipe = self.pipe.to("cuda")
-                print("✅ Model loaded on GPU")
-            else:
-                self.pipe = self.pipe.to("cpu")
-                print("✅ Model loaded on CPU")
-
-        except Exception as e:
-            print(f"❌ Error loading model: {e}")
-            self.pipe = None
-
-    def get_font(self, size):
-        try:
-            system_fonts = ["arial.ttf", "Arial.ttf", "DejaVuSans.ttf"]
-            for font_file in system_fonts:
-                try:
-                    return ImageFont.truetype(font_file, size)
-                except:
-                    continue
-            return ImageFont.load_default()
-        except Exception as e:
-            print(f"Font loading error: {e}")
-            return ImageFont.load_default()
-
-    def process_logo(self, logo_image, max_size=200):
-        if logo_image is None:
-            return None
+        # The negative prompt never changes: encode it once and keep it
+        self.prompt_cache.encode(pipe, NEGATIVE_PROMPT, model_id, pin=True)
+        print(f"✅ {model_id} loaded on {'GPU' if pipe.device.type == 'cuda' else 'CPU'}")
+        return pipe
+
+    def get_pipe(self, model_id=None):
+        # The default model comes from the warm-up; others load on first use
+        # and share identical components with it through the pool
+        if model_id is None or model_id == self.model_id:
+            return self.pipe
+        # Already loaded: no load stage, logging or negative prompt encoding
+        pipe = self.model_pool.lookup(model_id)
+        if pipe is not None:
+            return pipe
         try:
-            logo = logo_image.copy()
-            logo.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-            if logo.mode != 'RGBA':
-                logo = logo.convert('RGBA')
-            return logo
+            return self.load_pipeline(model_id)
         except Exception as e:
-            print(f"Logo processing error: {e}")
+            print(f"❌ Error loading model {model_id}: {e}")
             return None
 
-    def create_background(self, prompt, width=1024, height=1024):
-        if not self.pipe:
-            return self.create_fallback_background(width, height)
+    def get_font(self, size):
+        return poster_layout.get_font(size)
+
+    def process_logo(self, logo_image, max_size=poster_layout.LOGO_MAX_SIZE):
+        return poster_layout.process_logo(logo_image, max_size)
+
+    def logo_sizes(self):
+        """Every logo size a layout can ask for: the screen size and one per print size."""
+        sizes = {200}
+        for size in PRINT_SIZES.values():
+            if size:
+                sizes.add(int(200 * max(size) / 1024))
+        return sizes
+
+    def full_prompt(self, prompt):
+        return f"{prompt}, poster design, concept art, trending on artstation, sharp, 4k"
+
+    def create_background(self, prompt, width=1024, height=1024, seed=DEFAULT_SEED, job=None, model_id=None,
+                          steps=NUM_INFERENCE_STEPS):
+        return self.render_background(prompt, width, height, seed, job, model_id, steps).image
+
+    def render_background(self, prompt, width=1024, height=1024, seed=DEFAULT_SEED, job=None, model_id=None,
+                          steps=NUM_INFERENCE_STEPS):
+        """Like create_background, but says whether the image came from the model or the gradient fallback."""
+        model_id = model_id or self.model_id
+        if self.model_state == MODEL_COLD:
+            self.start_warmup()
+        pipe = self.get_pipe(model_id)
+        if not pipe:
+            return Background(self.create_fallback_background(width, height), False)
+
+        full_prompt = self.full_prompt(prompt)
+        key = cache_key(
+            prompt=full_prompt,
+            negative_prompt=NEGATIVE_PROMPT,
+            width=width,
+            height=height,
+            steps=steps,
+            guidance=GUIDANCE_SCALE,
+            scheduler=type(pipe.scheduler).__name__,
+            model_id=model_id,
+            seed=seed,
+        )
+        cached = self.background_cache.get(key)
+        if cached is not None:
+            return Background(cached, True)
 
-        full_prompt = f"{prompt}, poster design, concept art, trending on artstation, sharp, 4k"
         try:
-            image = self.pipe(
-                full_prompt,
-                negative_prompt="blurry, distorted, bad anatomy, low quality",
-                width=width,
-                height=height,
-                num_inference_steps=35,
-                guidance_scale=7.5
-            ).images[0]
-            return image
+            # The UNet needs multiples of 8; resize the odd sizes back afterwards
+            diffusion_size = latency_budget.scaled_size(width, height, 1.0)
+            image = self.batcher((model_id, *diffusion_size, steps), (full_prompt, seed, job))
+            if image.size != (width, height):
+                image = image.resize((width, height), Image.Resampling.LANCZOS)
+            try:
+                self.background_cache.put(key, image)
+            except Exception as e:
+                print(f"Background cache write error: {e}")
+            return Background(image, True)
+        except JobCancelled:
+            raise
         except Exception as e:
             print(f"Background generation error: {e}")
-            return self.create_fallback_background(width, height)
+            return Background(self.create_fallback_background(width, height), False)
+
+    def _run_background_batch(self, key, requests):
+        # One pipeline call for every queued request with this model,
+        # resolution and step count; a generator per prompt keeps each image
+        # identical to a solo render
+        model_id, width, height, steps = key
+        pipe = self.get_pipe(model_id)
+        prompts = [full_prompt for full_prompt, _, _ in requests]
+        prompt_embeds = self.prompt_cache.encode_batch(pipe, prompts, model_id)
+        negative_embeds = self.prompt_cache.encode(pipe, NEGATIVE_PROMPT, model_id, pin=True)
+        generators = [torch.Generator(device=pipe.device).manual_seed(seed) for _, seed, _ in requests]
+        jobs = [job for _, _, job in requests if job is not None]
+        step_timer = tracing.StepTimer(model=model_id, size=f"{width}x{height}")
+        step_times = []
+
+        def on_step(pipe, step, timestep, callback_kwargs):
+            step_timer.tick()
+            step_times.append(time.perf_counter())
+            # Only abort the shared diffusion once every request in it is gone
+            stopped = 0
+            for job in jobs:
+                try:
+                    job.report(step + 1, steps, "Rendering background")
+                except JobCancelled:
+                    stopped += 1
+            if stopped == len(requests):
+                raise JobCancelled("all requests in batch cancelled")
+            return callback_kwargs
+
+        started = time.perf_counter()
+        with tracing.stage("diffusion", model=model_id, batch=len(requests)), \
+                cpu_profile.inference_context(pipe):
+            images = pipe(
+                prompt_embeds=prompt_embeds,
+                negative_prompt_embeds=negative_embeds.expand(len(prompts), -1, -1),
+                width=width,
+                height=height,
+                num_inference_steps=steps,
+                guidance_scale=GUIDANCE_SCALE,
+                generator=generators,
+                callback_on_step_end=on_step
+            ).images
+        # Feed the deadline planner what a step and the fixed work cost right
+        # now, at this batch size, on this host
+        if len(step_times) >= 2:
+            per_step = (step_times[-1] - step_times[0]) / (len(step_times) - 1)
+            overhead = (time.perf_counter() - started) - per_step * len(step_times)
+            latency_budget.estimator.observe(model_id, width, height, per_step, overhead, batch_size=len(requests))
+        # In low-memory mode an idle text encoder doesn't need to stay resident
+        low_memory.release_text_encoder(pipe, self.prompt_cache)
+        return images
 
     def create_fallback_background(self, width, height):
         colors = [(100, 150, 255), (150, 200, 255)]
         return self.create_gradient_background(width, height, colors[0], colors[1])
 
     def create_gradient_background(self, width, height, color1, color2):
-        image = Image.new('RGB', (width, height))
-        draw = ImageDraw.Draw(image)
-        for y in range(height):
-            ratio = y / height
-            r = int(color1[0] * (1 - ratio) + color2[0] * ratio)
-            g = int(color1[1] * (1 - ratio) + color2[1] * ratio)
-            b = int(color1[2] * (1 - ratio) + color2[2] * ratio)
-            draw.line([(0, y), (width, y)], fill=(r, g, b))
-        return image
+        return gradients.linear_gradient(width, height, [color1, color2])
+
+    def layout_layers(self, width, height, subtitle, details, logo=None, scale=1.0):
+        return poster_layout.layout_layers(width, height, subtitle, details, logo, scale)
 
     def apply_text_layout(self, image, subtitle, details, logo=None):
-        poster = image.copy().convert('RGBA')
-        width, height = poster.size
-        overlay = Image.new('RGBA', poster.size, (0, 0, 0, 0))
-        draw = ImageDraw.Draw(overlay)
-
-        color_overlay = Image.new('RGBA', poster.size, (0, 0, 0, 80))
-        poster = Image.alpha_composite(poster, color_overlay)
-
-        base_size = min(width, height) // 15
-        subtitle_size = int(base_size * 0.8)
-        details_size = int(base_size * 0.5)
-
-        subtitle_font = self.get_font(subtitle_size)
-        details_font = self.get_font(details_size)
-
-        y_pos = height // 3
-        spacing = 60
-
-        if subtitle:
-            self.draw_text_with_outline(draw, subtitle, width//2, y_pos, subtitle_font, 'white', 'black', center=True)
-            y_pos += spacing * 2
-
-        if details:
-            for line in details.split('\n'):
-                if line.strip():
-                    self.draw_text_with_outline(draw, line.strip(), width//2, y_pos, details_font, 'lightgray', 'black', center=True)
-                    y_pos += spacing // 2
-
-        if logo:
-            logo_pos = (width - logo.size[0] - 50, 50)
-            poster.paste(logo, logo_pos, logo)
-
-        poster = Image.alpha_composite(poster, overlay)
-        return poster.convert('RGB')
-
-    def draw_text_with_outline(self, draw, text, x, y, font, fill_color, outline_color, center=False):
-        if center:
-            bbox = draw.textbbox((0, 0), text, font=font)
-            x = x - (bbox[2] - bbox[0]) // 2
-        for dx in range(-2, 3):
-            for dy in range(-2, 3):
-                draw.text((x + dx, y + dy), text, font=font, fill=outline_color)
-        draw.text((x, y), text, font=font, fill=fill_color)
+        return poster_layout.apply_text_layout(image, subtitle, details, logo)
+
+    def create_base_layer(self, background, logo=None):
+        return poster_layout.create_base_layer(background, logo)
+
+    def stamp_text(self, base, subtitle, details):
+        return poster_layout.stamp_text(base, subtitle, details)
+
+    def create_template_base(self, prompt, aspect_ratio, logo_image=None, seed=DEFAULT_SEED, model_id=None,
+                             quality=None):
+        """Base layer for a mail-merge template, cached on disk when its background came from the model.
+
+        Diffusion and logo processing happen once per template; variants only
+        pay for stamp_text. `quality` is a latency_budget preset ("deadline"
+        plans for DEADLINE_SECONDS).
+        """
+        model_id = model_id or self.model_id
+        width, height = ASPECT_RATIOS.get(aspect_ratio, (1024, 1024))
+        plan = latency_budget.plan(quality or QUALITY, model_id, width, height, DEADLINE_SECONDS)
+        logo = self.process_logo(logo_image)
+        pipe = self.get_pipe(model_id)
+        key = cache_key(
+            kind="template_base",
+            prompt=self.full_prompt(prompt),
+            negative_prompt=NEGATIVE_PROMPT,
+            width=width,
+            height=height,
+            diffusion_size=(plan.width, plan.height),
+            steps=plan.steps,
+            guidance=GUIDANCE_SCALE,
+            scheduler=type(pipe.scheduler).__name__ if pipe is not None else None,
+            model_id=model_id,
+            seed=seed,
+            logo=encoding.image_key(logo) if logo is not None else None,
+        )
+        cached = self.background_cache.get(key)
+        if cached is not None:
+            return cached
+
+        with tracing.stage("create_background"):
+            background = self.render_background(prompt, plan.width, plan.height, seed=seed, model_id=model_id,
+                                                steps=plan.steps)
+        image = background.image
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        base = self.create_base_layer(image, logo)
+        # A gradient fallback (no model, or diffusion failed) must not stand in for the template
+        if background.from_model:
+            try:
+                self.background_cache.put(key, base)
+            except Exception as e:
+                print(f"Template cache write error: {e}")
+        return base
+
+    def text_layer(self, text, x, y, font, fill_color, outline_color, center=False, stroke_width=2):
+        return poster_layout.text_layer(text, x, y, font, fill_color, outline_color, center, stroke_width)
+
+    def draw_text_with_outline(self, compositor, text, x, y, font, fill_color, outline_color, center=False):
+        layer, position = self.text_layer(text, x, y, font, fill_color, outline_color, center)
+        compositor.paste(layer, position)
+
+    def create_print_poster(self, background, prompt, subtitle, details, logo_image, size, out_path,
+                            seed=DEFAULT_SEED, job=None, model_id=None, refine_strength=PRINT_REFINE_STRENGTH):
+        """Render a print-size poster from a screen-size `background`, streamed to a PNG at `out_path`.
+
+        The background is upscaled tile by tile (and optionally re-diffused per
+        tile), then darkened and given its logo and text band by band at full
+        resolution, so peak memory depends on the tile size and the poster
+        width, never on the poster height.
+        """
+        width, height = size
+        scale = max(width, height) / 1024
+        canvas = tiled_render.TiledCanvas(width, height)
+        source = tiled_render.upscaler(background, width, height)
+
+        pipe = self.get_pipe(model_id) if refine_strength > 0 else None
+        if pipe is not None:
+            model_id = model_id or self.model_id
+            source = tiled_render.TileRefiner(
+                pipe,
+                source,
+                self.prompt_cache.encode(pipe, self.full_prompt(prompt), model_id),
+                self.prompt_cache.encode(pipe, NEGATIVE_PROMPT, model_id, pin=True),
+                strength=refine_strength,
+                steps=PRINT_REFINE_STEPS,
+                guidance_scale=GUIDANCE_SCALE,
+                seed=seed
+            )
 
-poster_gen = SimplePosterGenerator()
+        logo = self.process_logo(logo_image, max_size=int(200 * scale))
+        layers = self.layout_layers(width, height, subtitle, details, logo, scale=scale)
+
+        def emit(y, rows):
+            band = PosterCompositor(Image.fromarray(rows, "RGB"), tint_alpha=poster_layout.TINT_ALPHA)
+            for layer, (x, layer_y) in layers:
+                if layer_y < y + len(rows) and layer_y + layer.height > y:
+                    band.paste(layer, (x, layer_y - y))
+            writer.write(np.asarray(band.result()))
+
+        def progress(done, total):
+            if job:
+                job.report(done, total, f"Rendering print tiles ({done}/{total})")
 
-def generate_simple_poster(prompt, subtitle, details, logo_image, aspect_ratio):
-    aspect_ratios = {
-        "1:1 - Square": (1024, 1024),
-        "2:3 - Portrait": (683, 1024),
-        "3:2 - Landscape": (1024, 683),
-        "3:4 - Poster": (768, 1024),
-        "16:9 - Widescreen": (1024, 576)
-    }
-    width, height = aspect_ratios.get(aspect_ratio, (1024, 1024))
-    background = poster_gen.create_background(prompt, width, height)
-    processed_logo = poster_gen.process_logo(logo_image)
-    final_poster = poster_gen.apply_text_layout(background, subtitle, details, processed_logo)
+        with tracing.stage("print_render", size=f"{width}x{height}", refined=pipe is not None), \
+                tiled_render.StreamingPNGWriter(out_path, width, height, encoding.PNG_COMPRESS_LEVEL) as writer:
+            canvas.render(source, emit, progress)
+        return out_path
+
+poster_gen = SimplePosterGenerator()
+job_manager = JobManager(max_workers=JOB_WORKERS, max_queue=MAX_QUEUED_JOBS)
+
+@status_server.route("/healthz")
+def healthz():
+    return status_server.json_response({"status": "ok"})
+
+@status_server.route("/readyz")
+def readyz():
+    readiness = poster_gen.readiness()
+    readiness["queue_depth"] = job_manager.queue_depth()
+    readiness["model_pool"] = poster_gen.model_pool.stats()
+    readiness["low_memory"] = low_memory.stats()
+    return status_server.json_response(readiness, 200 if readiness["ready"] else 503)
+
+@tracing.collector
+def poster_gauges():
+    gauges = []
+    for name, value in poster_gen.background_cache.stats().items():
+        gauges.append((f"poster_background_cache_{name}", "Background cache statistics", value, {}))
+    for name, value in poster_gen.batcher.stats().items():
+        gauges.append((f"poster_batcher_{name}", "Micro-batcher statistics", value, {}))
+    for name, value in poster_gen.prompt_cache.stats().items():
+        gauges.append((f"poster_prompt_cache_{name}", "Prompt embedding cache statistics", value, {}))
+    for name, value in logos.cache_info().items():
+        gauges.append((f"poster_logo_cache_{name}", "Processed logo cache statistics", value, {}))
+    for name, value in encoding.cache_info().items():
+        gauges.append((f"poster_encode_cache_{name}", "Encoded output cache statistics", value, {}))
+    for name, value in low_memory.stats().items():
+        gauges.append((f"poster_low_memory_{name}", "Memory-mapped weight statistics", value, {}))
+    for row in latency_budget.estimator.snapshot():
+        labels = {"model": row["model"], "size": f"{row['width']}x{row['height']}", "batch": row["batch_size"]}
+        gauges.append(("poster_step_seconds_estimate", "Rolling seconds per diffusion step", row["step_seconds"], labels))
+        gauges.append(("poster_overhead_seconds_estimate", "Rolling fixed seconds per diffusion call",
+                       row["overhead_seconds"], labels))
+    gauges.append(("poster_job_queue_depth", "Jobs queued or running", job_manager.queue_depth(), {}))
+    gauges.append(("poster_model_ready", "1 when the default model is loaded", int(poster_gen.model_state == MODEL_READY), {}))
+    return gauges
+
+def model_status_text():
+    state = poster_gen.model_state
+    if state == MODEL_READY:
+        return f"🟢 Model ready ({poster_gen.model_id}, loaded in {poster_gen.model_load_seconds}s)"
+    if state == MODEL_FAILED:
+        return f"🔴 Model failed to load, using gradient backgrounds: {poster_gen.model_error}"
+    return "🟡 Model warming up — posters use a gradient background until it is ready"
+
+def compose_poster(background, subtitle, details, logo_image):
+    with tracing.stage("process_logo"):
+        processed_logo = poster_gen.process_logo(logo_image)
+    with tracing.stage("apply_text_layout"):
+        return poster_gen.apply_text_layout(background, subtitle, details, processed_logo)
+
+def generate_simple_poster(prompt, subtitle, details, logo_image, aspect_ratio, model_id=None, seed=DEFAULT_SEED, job=None):
+    width, height = ASPECT_RATIOS.get(aspect_ratio, (1024, 1024))
+    with tracing.request_trace("generate_simple_poster", aspect_ratio=aspect_ratio, model=model_id or poster_gen.model_id):
+        with tracing.stage("create_background"):
+            if job:
+                job.phase(0.0, COMPOSE_PROGRESS)
+            background = poster_gen.create_background(prompt, width, height, seed=seed, job=job, model_id=model_id)
+        if job:
+            job.phase(0.0, 1.0)
+            job.report(COMPOSE_PROGRESS, message="Adding text and logo")
+        final_poster = compose_poster(background, subtitle, details, logo_image)
     return final_poster
 
+def print_base_size(size):
+    """Diffusion size with the paper's aspect ratio: longest side 1024, multiples of 8."""
+    width, height = size
+    scale = 1024 / max(width, height)
+    return max(8, int(width * scale) // 8 * 8), max(8, int(height * scale) // 8 * 8)
+
+def render_sizes(aspect_ratio, print_size=None):
+    """(diffusion size, print size or None) for a request."""
+    screen_width, screen_height = ASPECT_RATIOS.get(aspect_ratio, (1024, 1024))
+    size = PRINT_SIZES.get(print_size)
+    if not size:
+        return (screen_width, screen_height), None
+    if screen_width > screen_height:
+        size = (size[1], size[0])
+    return print_base_size(size), size
+
+def background_key(prompt, aspect_ratio, model_id=None, print_size=None, quality=None, deadline=None,
+                   seed=DEFAULT_SEED):
+    """Identity of the diffusion inputs; text, logo and layout are deliberately left out.
+
+    `seed` None stands for a random seed chosen at render time.
+    """
+    (width, height), _ = render_sizes(aspect_ratio, print_size)
+    quality = quality or QUALITY
+    return cache_key(
+        prompt=prompt,
+        width=width,
+        height=height,
+        model_id=model_id or poster_gen.model_id,
+        quality=quality,
+        deadline=deadline if quality == latency_budget.DEADLINE else None,
+        seed=seed,
+        # A gradient fallback must not outlive the model warming up
+        model_ready=poster_gen.model_state == MODEL_READY,
+    )
+
+# paths: {"web": path, "print": path}; background: the diffusion output the
+# poster was composed on, kept by the UI so text-only edits can reuse it
+PosterOutput = namedtuple("PosterOutput", ["paths", "background"])
+
+def render_poster_files(prompt, subtitle, details, logo_image, aspect_ratio, model_id=None, print_size=None,
+                        quality=None, deadline=None, background=None, job=None, seed=DEFAULT_SEED):
+    """Generate a poster and write its web/print files.
+
+    The UI is handed the pre-encoded web file, so Gradio ships a compact WebP
+    instead of re-encoding the full PIL image as PNG on every response. With a
+    paper `print_size` the print file is rendered tile by tile instead of
+    being the screen-size poster. `quality` picks the step count and
+    diffusion size (a latency_budget preset, or "deadline" to fit `deadline`
+    seconds including time spent queued). Passing the `background` of an
+    earlier result skips diffusion entirely.
+    """
+    (width, height), size = render_sizes(aspect_ratio, print_size)
+    model_id = model_id or poster_gen.model_id
+    quality = quality or QUALITY
+    render_started = time.time()
+    with tracing.request_trace("render_poster", aspect_ratio=aspect_ratio, print_size=print_size, model=model_id,
+                               quality=quality, reused_background=background is not None):
+        background_rendered = background is None
+        if background_rendered:
+            elapsed = time.monotonic() - job.created if job else 0.0
+            plan = latency_budget.plan(quality, model_id, width, height, deadline, elapsed)
+            if job:
+                job.phase(0.0, PRINT_BACKGROUND_PROGRESS if size else COMPOSE_PROGRESS)
+                job.report(0.0, message=f"Rendering {plan.steps} steps at {plan.width}×{plan.height} "
+                                        f"(≈{plan.estimated_seconds:.0f}s)")
+            with tracing.stage("create_background"):
+                background = poster_gen.create_background(prompt, plan.width, plan.height, seed=seed, job=job,
+                                                          model_id=model_id, steps=plan.steps)
+            if background.size != (width, height):
+                background = background.resize((width, height), Image.Resampling.LANCZOS)
+
+        print_path = None
+        if size:
+            print_dir = os.path.join(OUTPUT_DIR, "print")
+            os.makedirs(print_dir, exist_ok=True)
+            print_path = os.path.join(print_dir, f"poster-{job.id if job else uuid.uuid4().hex[:12]}.png")
+            if job:
+                job.phase(PRINT_BACKGROUND_PROGRESS if background_rendered else 0.0, COMPOSE_PROGRESS)
+            poster_gen.create_print_poster(background, prompt, subtitle, details, logo_image, size, print_path,
+                                           seed=seed, job=job, model_id=model_id)
+            encoding.prune_directory(print_dir, PRINT_FILES_KEEP, since=render_started)
+
+        if job:
+            job.phase(0.0, 1.0)
+            job.report(COMPOSE_PROGRESS, message="Adding text and logo")
+        poster = compose_poster(background, subtitle, details, logo_image)
+        if job:
+            job.report(0.98, message="Encoding downloads")
+        key = encoding.image_key(poster)
+        names = ("web",) if print_path else ("web", "print")
+        paths = encoding.write_files(encoding.derivatives(poster, names=names, key=key), OUTPUT_DIR, key)
+        encoding.prune_directory(OUTPUT_DIR, OUTPUT_FILES_KEEP, since=render_started)
+    if print_path:
+        paths["print"] = print_path
+    return PosterOutput(paths, background)
+
+def resolve_seed(seed):
+    """A fixed seed from the UI, or None for "0 = random"."""
+    seed = int(seed or 0)
+    return seed if seed > 0 else None
+
+def overlay_key(subtitle, details, logo_image):
+    return (subtitle, details, logos.logo_key(logo_image) if logo_image is not None else None)
+
+def session_background(session, key):
+    if session and session.get("key") == key:
+        return session["background"]
+    return None
+
+def format_job_status(job):
+    depth = job_manager.queue_depth()
+    return f"**{job.message}** — {int(job.progress * 100)}% · job `{job.id}` · {depth} in queue"
+
+def generate_poster_stream(prompt, subtitle, details, logo_image, aspect_ratio, model_id=None, print_size=None,
+                           quality=None, deadline=None, seed=0, session=None):
+    fixed_seed = resolve_seed(seed)
+    key = background_key(prompt, aspect_ratio, model_id, print_size, quality, deadline, fixed_seed)
+    overlay = overlay_key(subtitle, details, logo_image)
+    background = session_background(session, key)
+    if background is not None and fixed_seed is None and session.get("overlay") == overlay:
+        # Nothing changed and the seed is random: the user is asking for a new background
+        background = None
+    if background is not None and not PRINT_SIZES.get(print_size):
+        # Only text, logo or layout changed: compose right here, no job and no diffusion
+        output = render_poster_files(prompt, subtitle, details, logo_image, aspect_ratio, model_id, print_size,
+                                     quality, deadline, background)
+        paths = output.paths
+        yield paths["web"], "**Done** — reused the background, only text and logo were redrawn", None, \
+            [paths["web"], paths["print"]], {**session, "overlay": overlay}
+        return
+
+    render_seed = session["seed"] if background is not None else fixed_seed or random.randrange(1, 2**31)
+    try:
+        job = job_manager.submit(render_poster_files, prompt, subtitle, details, logo_image, aspect_ratio,
+                                 model_id, print_size, quality, deadline, background, seed=render_seed)
+    except JobQueueFull:
+        raise gr.Error("The generator is busy right now. Please try again in a moment.")
+
+    try:
+        while not job.wait(timeout=0.5):
+            job.touch()
+            yield gr.update(), format_job_status(job), job.id, gr.update(), gr.update()
+        if job.error is not None:
+            raise gr.Error(f"Generation failed: {job.error}")
+        if job.result is None:
+            yield gr.update(), format_job_status(job), None, gr.update(), gr.update()
+        else:
+            paths, background = job.result
+            yield paths["web"], f"{format_job_status(job)} · seed {render_seed}", None, \
+                [paths["web"], paths["print"]], \
+                {"key": key, "background": background, "seed": render_seed, "overlay": overlay}
+    finally:
+        # Client disconnected or the stream was cancelled: stop the diffusion too
+        if not job.finished:
+            job.cancel()
+
+def warm_logo(logo_image):
+    """Pre-scale a fresh upload for every output size while the user is still editing."""
+    if logo_image is not None:
+        logos.prescale(logo_image, poster_gen.logo_sizes())
+
+def live_preview(prompt, subtitle, details, logo_image, aspect_ratio, model_id=None, print_size=None,
+                 quality=None, deadline=None, seed=0, session=None, enabled=True):
+    """Redraw text and logo on the session's background as they are edited; a no-op without one."""
+    key = background_key(prompt, aspect_ratio, model_id, print_size, quality, deadline, resolve_seed(seed))
+    background = session_background(session, key)
+    if not enabled or background is None:
+        return gr.update()
+    started = time.time()
+    with tracing.request_trace("live_preview"):
+        poster = compose_poster(background, subtitle, details, logo_image)
+        preview = encoding.encode(poster, max_side=encoding.DERIVATIVES["web"][0])
+    path = encoding.write_files({"preview": preview}, OUTPUT_DIR, encoding.image_key(poster))["preview"]
+    encoding.prune_directory(OUTPUT_DIR, OUTPUT_FILES_KEEP, since=started)
+    return path
+
+def cancel_poster_job(job_id):
+    if job_id and job_manager.cancel(job_id):
+        return "**Cancelling…**"
+    return "Nothing to cancel"
+
 def create_simple_interface():
     with gr.Blocks(title="🎨 Simple AI Poster Generator", theme=gr.themes.Glass()) as demo:
         gr.HTML("""
@@ -200,24 +702,76 @@ def create_simple_interface():
                 with gr.Group():
                     gr.Markdown("### 📐 *Output Settings*")
                     aspect_ratio_radio = gr.Radio(
-                        choices=["1:1 - Square", "2:3 - Portrait", "3:2 - Landscape", "3:4 - Poster", "16:9 - Widescreen"],
+                        choices=list(ASPECT_RATIOS),
                         value="3:4 - Poster",
                         label="Aspect Ratio"
                     )
+                    model_dropdown = gr.Dropdown(
+                        choices=AVAILABLE_MODELS,
+                        value=AVAILABLE_MODELS[0],
+                        label="Model"
+                    )
+                    print_size_dropdown = gr.Dropdown(
+                        choices=list(PRINT_SIZES),
+                        value="Screen only",
+                        label="Print file"
+                    )
+                    quality_radio = gr.Radio(
+                        choices=QUALITY_CHOICES,
+                        value=QUALITY,
+                        label="Quality",
+                        info="draft/standard/final fix the step count; deadline fits the time below on this server"
+                    )
+                    deadline_slider = gr.Slider(5, 300, value=DEADLINE_SECONDS, step=5, label="Deadline (seconds)")
+                    seed_input = gr.Number(
+                        value=0,
+                        precision=0,
+                        minimum=0,
+                        label="Seed",
+                        info="0 rolls a new background on every Generate; any other value repeats it"
+                    )
+                    live_preview_checkbox = gr.Checkbox(value=True, label="Live preview of text and logo edits")
                     generate_btn = gr.Button("🚀 Generate Poster", variant="primary", size="lg")
+                    cancel_btn = gr.Button("✖ Cancel", variant="secondary", size="sm")
 
             with gr.Column(scale=2):
                 gr.Markdown("### ✨ *Generated Poster*")
+                model_status = gr.Markdown(model_status_text())
                 output_image = gr.Image(label="Your AI-Generated Poster", type="pil", interactive=False)
+                job_status = gr.Markdown()
+                downloads = gr.File(label="Downloads (web and print)", file_count="multiple", interactive=False)
 
+        job_id_state = gr.State(None)
+        # Last background of this session and the key of the inputs it came from
+        session_state = gr.State(None)
+        poster_inputs = [prompt_input, subtitle_input, details_input, logo_upload, aspect_ratio_radio, model_dropdown,
+                         print_size_dropdown, quality_radio, deadline_slider, seed_input, session_state]
+
+        # The handler only polls the job, so it can run far wider than the
+        # worker pool; JobManager enforces the real queue limit
         generate_btn.click(
-            generate_simple_poster,
-            inputs=[prompt_input, subtitle_input, details_input, logo_upload, aspect_ratio_radio],
-            outputs=[output_image]
+            generate_poster_stream,
+            inputs=poster_inputs,
+            outputs=[output_image, job_status, job_id_state, downloads, session_state],
+            concurrency_limit=MAX_QUEUED_JOBS
         )
+        for edit in (subtitle_input.input, details_input.input, logo_upload.change):
+            edit(
+                live_preview,
+                inputs=poster_inputs + [live_preview_checkbox],
+                outputs=[output_image],
+                trigger_mode="always_last",
+                show_progress="hidden",
+                concurrency_limit=MAX_QUEUED_JOBS
+            )
+        logo_upload.upload(warm_logo, inputs=[logo_upload], show_progress="hidden")
+        cancel_btn.click(cancel_poster_job, inputs=[job_id_state], outputs=[job_status])
+        demo.load(model_status_text, outputs=[model_status], every=3)
 
     return demo
 
 if __name__ == "__main__":
+    poster_gen.start_warmup()
+    status_server.start()
     demo = create_simple_interface()
     demo.launch(share=True, debug=True)